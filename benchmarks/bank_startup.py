@@ -0,0 +1,72 @@
+from argparse   import ArgumentParser
+from json       import loads, dumps
+from os         import O_RDONLY, POSIX_FADV_DONTNEED, close, open as os_open, posix_fadvise
+from pathlib    import Path
+from shutil     import copy
+from subprocess import run
+from sys        import executable
+from tempfile   import TemporaryDirectory
+
+from fartpiano.packed import pack_bank
+from fartpiano.utils  import get_default_bank_path
+
+# Runs in a fresh interpreter so every layout starts from the same empty process
+_CHILD = '''
+from pathlib import Path
+from time    import perf_counter
+from json    import dumps
+from fartpiano.sampler import read_banks
+
+start = perf_counter()
+read_banks(Path({path!r}), preload=True)
+elapsed = perf_counter() - start
+status = dict(line.split(':', 1) for line in Path('/proc/self/status').read_text().splitlines())
+print(dumps({{'seconds': elapsed, 'rss': int(status['VmRSS'].split()[0]), 'anon': int(status['RssAnon'].split()[0])}}))
+'''
+
+def make_loose_banks(source: Path, target: Path, count: int) -> None:
+    bank_dict = loads((source/f'{source.name}.json').read_text())
+    for index in range(count):
+        name = f'{source.name}{index}'
+        bank_dir = target/name
+        bank_dir.mkdir()
+        for wav in source.glob('*.wav'):
+            copy(wav, bank_dir/wav.name)
+        (bank_dir/f'{name}.json').write_text(dumps(dict(bank_dict, name=name)))
+
+def drop_page_cache(root: Path) -> None:
+    # Cold start without needing root, the files are clean so the kernel can let them go
+    for path in root.rglob('*'):
+        if path.is_file():
+            descriptor = os_open(path, O_RDONLY)
+            posix_fadvise(descriptor, 0, 0, POSIX_FADV_DONTNEED)
+            close(descriptor)
+
+def measure(path: Path, cold: bool) -> dict:
+    if cold:
+        drop_page_cache(path)
+    result = run([executable, '-c', _CHILD.format(path=str(path))], capture_output=True, text=True, check=True)
+    return loads(result.stdout.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Startup time and memory of loose wav banks against packed banks')
+    parser.add_argument('--bank', type=Path, default=get_default_bank_path()/'fart')
+    parser.add_argument('--banks', type=int, default=8, help='How many copies of the bank are installed')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp:
+        loose = Path(temp)/'loose'
+        packed = Path(temp)/'packed'
+        loose.mkdir()
+        packed.mkdir()
+        make_loose_banks(args.bank, loose, args.banks)
+        for bank_dir in loose.iterdir():
+            pack_bank(bank_dir, packed)
+
+        for name, path in (('loose', loose), ('packed', packed)):
+            for cold in (True, False):
+                results = [measure(path, cold) for _ in range(args.rounds)]
+                best = min(results, key=lambda result: result['seconds'])
+                print(f'{name:<7} {"cold" if cold else "warm"}  {args.banks} banks  read_banks {best["seconds"] * 1e3:8.1f} ms  '
+                      f'rss {best["rss"] / 1024:6.1f} MB  private {best["anon"] / 1024:6.1f} MB')
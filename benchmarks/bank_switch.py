@@ -0,0 +1,118 @@
+from argparse  import ArgumentParser
+from json      import dumps, loads
+from pathlib   import Path
+from tempfile  import TemporaryDirectory
+from threading import Thread, Event
+from time      import perf_counter, sleep
+from typing    import List
+
+from headless import run_headless
+run_headless()
+
+from fartpiano.metrics import MetricsRegistry
+from fartpiano.packed  import pack_bank
+from fartpiano.sampler import get_banks, read_banks
+from fartpiano.sound   import SoundManager, init_sound
+from fartpiano.utils   import get_default_bank_path
+
+def memory(field: str) -> int:
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith(f'{field}:'):
+            return int(line.split()[1]) * 1024
+    return 0
+
+def reset_peak() -> None:
+    Path('/proc/self/clear_refs').write_text('5')
+
+def with_packed_copy(banks: Path, temp: Path) -> Path:
+    '''The banks in banks plus a packed copy of the first under a name of its own, for when only one is installed.'''
+    with_copy = temp/'banks'
+    with_copy.mkdir()
+    for item in banks.iterdir():
+        (with_copy/item.name).symlink_to(item.resolve())
+    source = next(item for item in sorted(banks.iterdir()) if (item/f'{item.name}.json').exists())
+    bank_dict = loads((source/f'{source.name}.json').read_text())
+    bank_dict['name'] = f'{source.name}-packed'
+    renamed = temp/bank_dict['name']
+    renamed.mkdir()
+    for item in source.iterdir():
+        (renamed/item.name).symlink_to(item.resolve())
+    (renamed/f'{source.name}.json').unlink()
+    (renamed/f'{renamed.name}.json').write_text(dumps(bank_dict))
+    pack_bank(renamed, with_copy)
+    return with_copy
+
+class Player(Thread):
+    '''Keeps playing the keys of whatever bank is current, timing every note on like the MIDI thread would see it.'''
+
+    def __init__(self, manager: SoundManager, interval: float) -> None:
+        Thread.__init__(self, daemon=True)
+        self._manager = manager
+        self._interval = interval
+        self._stopped = Event()
+        self.attacks: List[float] = []
+
+    def run(self) -> None:
+        index = 0
+        while not self._stopped.is_set():
+            pitches = sorted(self._manager.bank.samples)
+            pitch = pitches[index % len(pitches)]
+            start = perf_counter()
+            self._manager.attack(pitch)
+            self.attacks.append(perf_counter() - start)
+            self._stopped.wait(self._interval)
+            self._manager.release(pitch)
+            index += 7
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Latency and memory of switching banks while playing')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--interval', type=float, default=.02)
+    args = parser.parse_args()
+
+    init_sound()
+    temp = TemporaryDirectory()
+    read_banks(args.banks, False)
+    if len(get_banks()) < 2:
+        print(f'Only one bank in {args.banks}, switching to a packed copy of it')
+        read_banks(with_packed_copy(args.banks, Path(temp.name)), False)
+    banks = get_banks()
+
+    first = banks[0]
+    first.cache.preload(first.playable())
+    registry = MetricsRegistry()
+    manager = SoundManager(first, True, metrics=registry)
+    player = Player(manager, args.interval)
+    player.start()
+    sleep(.5)
+
+    for bank in banks[1:] + banks[:1]:
+        old = manager.bank
+        before = memory('VmRSS')
+        reset_peak()
+        player.attacks.clear()
+
+        start = perf_counter()
+        manager.switch_bank(bank)
+        call = perf_counter() - start
+        while manager.bank is not bank:
+            sleep(.0005)
+        latency = perf_counter() - start
+        peak = memory('VmHWM')
+        sleep(.3)
+        after = memory('VmRSS')
+
+        attacks = sorted(player.attacks)
+        print(f'{old.name} -> {bank.name} ({type(bank.cache).__name__}): switch_bank {call * 1e6:5.0f} us  ready after {latency * 1e3:7.1f} ms  '
+              f'note on while loading p50 {attacks[len(attacks) // 2] * 1e6:5.0f} us max {attacks[-1] * 1e6:6.0f} us  '
+              f'rss {before / 2**20:6.1f} MB, both resident {peak / 2**20:6.1f} MB (+{(peak - before) / 2**20:5.1f}), after {after / 2**20:6.1f} MB')
+
+    player.stop()
+    player.join()
+    snapshot = registry.snapshot()
+    print(f'switches {snapshot["bank_switches"]}  underruns {snapshot["mixer_underruns"]}  notes {snapshot["notes_attacked"]}')
+    manager.close()
+    temp.cleanup()
@@ -0,0 +1,23 @@
+from argparse import ArgumentParser
+from hashlib  import sha256
+from pathlib  import Path
+from tempfile import TemporaryDirectory
+from time     import perf_counter
+
+from fartpiano.builder    import create_bank
+from fartpiano.buildcache import BuildCache
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Bank build time with and without the build cache')
+    parser.add_argument('input', type=Path)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp:
+        cache = BuildCache(Path(temp)/'cache')
+        runs = (('no cache', None, .5), ('cold cache', cache, .5), ('warm cache', cache, .5), ('new boundries', cache, .4))
+        for name, run_cache, sustain_percent in runs:
+            start = perf_counter()
+            bank_zip = create_bank(args.input, args.workers, Path(temp), cache=run_cache, sustain_percent=sustain_percent)
+            print(f'{name:<14} {perf_counter() - start:6.2f} s  {sha256(bank_zip.read_bytes()).hexdigest()[:12]}')
+        print(f'cache holds {cache.size / 1024 / 1024:.1f} MB')
@@ -0,0 +1,182 @@
+from argparse    import ArgumentParser
+from collections import deque
+from pathlib     import Path
+from threading   import active_count
+from time        import perf_counter, sleep
+from typing      import Dict, List, Tuple
+
+from headless import run_headless
+run_headless()
+
+from mido import Message, MidiFile
+
+from fartpiano.midi    import MIDIDeviceManager
+from fartpiano.piano   import Piano
+from fartpiano.engine  import VoiceEngine
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.utils   import get_default_bank_path
+
+from scripted_port import PortRegistry, play_script
+
+Script = List[Tuple[float, Message]]
+
+def os_threads() -> int:
+    # Counts SDL's audio thread and the port's thread as well as Python's own
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith('Threads:'):
+            return int(line.split()[1])
+    return 0
+
+class Probe(object):
+    '''Timestamps every event where it is sent, dispatched to the engine and handed to the mixer.'''
+
+    def __init__(self, engine: VoiceEngine) -> None:
+        self._sent: deque = deque()
+        self._queued: deque = deque()
+        self.reset()
+
+        attack, release, render = engine.attack, engine.release, engine.render
+
+        # Queue the timestamp before the engine sees the command so a render never
+        # consumes a command the probe has not accounted for yet
+        def traced_attack(*args) -> None:
+            self._dispatched()
+            attack(*args)
+
+        def traced_release(*args) -> None:
+            self._dispatched()
+            release(*args)
+
+        def traced_render(frames: int = None):
+            pending = len(self._queued)
+            block = render(frames)
+            now = perf_counter()
+            for _ in range(pending):
+                kind, sent = self._queued.popleft()
+                self.output[kind].append(now - sent)
+            return block
+
+        engine.attack, engine.release, engine.render = traced_attack, traced_release, traced_render
+
+    def reset(self) -> None:
+        self.dispatch: Dict[str, List[float]] = {'note_on': [], 'note_off': []}
+        self.output: Dict[str, List[float]] = {'note_on': [], 'note_off': []}
+        self.first_sent = None
+        self.last_dispatch = None
+        self.peak_threads = (0, 0)
+
+    @property
+    def settled(self) -> bool:
+        return not self._sent and not self._queued
+
+    def on_send(self, message: Message) -> None:
+        now = perf_counter()
+        if self.first_sent is None:
+            self.first_sent = now
+        self._sent.append((message.type, now))
+
+    def _dispatched(self) -> None:
+        kind, sent = self._sent.popleft()
+        now = perf_counter()
+        self.dispatch[kind].append(now - sent)
+        self._queued.append((kind, sent))
+        self.last_dispatch = now
+        self.peak_threads = max(self.peak_threads, (active_count(), os_threads()))
+
+def scales(notes: List[int], hold: float) -> Script:
+    script = []
+    for note in notes:
+        script.append((hold, Message('note_on', note=note, velocity=100)))
+        script.append((hold, Message('note_off', note=note)))
+    return script
+
+def trill(notes: List[int], interval: float, count: int) -> Script:
+    script = []
+    for index in range(count):
+        note = notes[index % 2]
+        script.append((interval, Message('note_on', note=note, velocity=100)))
+        script.append((interval, Message('note_off', note=note)))
+    return script
+
+def chords(notes: List[int], size: int, hold: float, count: int) -> Script:
+    script = []
+    for index in range(count):
+        chord = [notes[(index + step * 3) % len(notes)] for step in range(size)]
+        script += [(hold if step == 0 else 0, Message('note_on', note=note, velocity=100)) for step, note in enumerate(chord)]
+        script += [(hold if step == 0 else 0, Message('note_off', note=note)) for step, note in enumerate(chord)]
+    return script
+
+def recording(midi_file: Path, notes: List[int]) -> Script:
+    script = []
+    delay = 0
+    for message in MidiFile(midi_file):
+        delay += message.time
+        if message.type in ('note_on', 'note_off') and message.note in notes:
+            # Running status note_on with no velocity is a release
+            if message.type == 'note_on' and message.velocity == 0:
+                message = Message('note_off', note=message.note)
+            script.append((delay, message.copy(channel=0)))
+            delay = 0
+    return script
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+def run(name: str, script: Script, piano: Piano, probe: Probe, registry: PortRegistry) -> None:
+    engine = piano.sound_manager.engine
+    probe.reset()
+    manager = MIDIDeviceManager('scripted', registry, lister=registry.list_names)
+    manager.add_listener(piano)
+    manager.start()
+    port = registry.wait_for_port()
+
+    play_script(port, script, probe.on_send).join()
+    while not probe.settled:
+        sleep(0.001)
+    manager.stop()
+    manager.join()
+
+    # Let every voice ring out so the next scenario starts from silence
+    engine.stop_all()
+    while not engine.idle:
+        sleep(0.001)
+
+    events = len(probe.dispatch['note_on']) + len(probe.dispatch['note_off'])
+    throughput = events / (probe.last_dispatch - probe.first_sent)
+    print(f'{name}: {events} events, {throughput:,.0f} events/s dispatched, '
+          f'peak threads {probe.peak_threads[0]} python / {probe.peak_threads[1]} os')
+    for stage, latencies in (('dispatch', probe.dispatch), ('to mixer', probe.output)):
+        for kind in ('note_on', 'note_off'):
+            values = sorted(latencies[kind])
+            print(f'    {stage:<9} {kind:<9} p50={percentile(values, .5) * 1e3:7.3f} ms  '
+                  f'p99={percentile(values, .99) * 1e3:7.3f} ms  max={values[-1] * 1e3:7.3f} ms')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Note to mixer latency through MIDIDeviceManager, Piano and the voice engine on a scripted port')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--events', type=Path, default=None, help='Replay a MIDI file instead of the built in scenarios')
+    parser.add_argument('--trill-interval', type=float, default=.008)
+    parser.add_argument('--chord-size', type=int, default=10)
+    parser.add_argument('--count', type=int, default=100)
+    args = parser.parse_args()
+
+    read_banks(args.banks, preload=True)
+    bank = get_bank()
+    notes = sorted(pitch.midi for pitch in bank.zones)
+
+    print(f'idle threads {active_count()} python / {os_threads()} os')
+    piano = Piano(bank)
+    probe = Probe(piano.sound_manager.engine)
+    registry = PortRegistry()
+    print(f'piano threads {active_count()} python / {os_threads()} os')
+
+    if args.events:
+        run(args.events.name, recording(args.events, notes), piano, probe, registry)
+    else:
+        middle = notes[len(notes) // 2:len(notes) // 2 + 2]
+        run('scales', scales(notes, .03), piano, probe, registry)
+        run('trill', trill(middle, args.trill_interval, args.count), piano, probe, registry)
+        run('burst trill', trill(middle, 0, args.count), piano, probe, registry)
+        run('chords', chords(notes, args.chord_size, .05, args.count // 4), piano, probe, registry)
+
+    piano.sound_manager.close()
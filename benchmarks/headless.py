@@ -0,0 +1,5 @@
+from os import environ
+
+def run_headless() -> None:
+    # Benchmarks run headless, so send the audio to SDL's null device. It has to be set before pygame is imported.
+    environ.setdefault('SDL_AUDIODRIVER', 'dummy')
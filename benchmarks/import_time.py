@@ -0,0 +1,45 @@
+from argparse   import ArgumentParser
+from re         import match
+from subprocess import run
+from sys        import executable, exit
+
+# Modules that only the bank building tools need, none of them may load on the way to playing
+BUILD_ONLY = ('librosa', 'numba', 'scipy', 'sklearn')
+# Modules the playback path itself only needs on request
+ON_REQUEST = ('asyncio',)
+
+def import_times(module: str) -> dict:
+    result = run([executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        found = match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if found:
+            times[found.group(4)] = int(found.group(2))
+    return times
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Cold import time of the playback path, fails when build only modules sneak back in')
+    parser.add_argument('--module', default='fartpiano.__main__')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None, help='Fail when the best run takes longer than this many milliseconds')
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(times[args.module] for times in runs) / 1e3
+    print(f'{args.module}: best of {args.runs} {best:.1f} ms')
+
+    slowest = sorted(runs[0].items(), key=lambda item: item[1], reverse=True)
+    for name, micros in [item for item in slowest if '.' not in item[0]][:8]:
+        print(f'  {name:<24} {micros / 1e3:8.1f} ms')
+
+    leaked = sorted({name.split('.')[0] for name in runs[0]} & set(BUILD_ONLY))
+    if leaked:
+        print(f'build only modules imported: {", ".join(leaked)}')
+        exit(1)
+    eager = sorted({name.split('.')[0] for name in runs[0]} & set(ON_REQUEST))
+    if eager:
+        print(f'modules imported before they are needed: {", ".join(eager)}')
+        exit(1)
+    if args.budget is not None and best > args.budget:
+        print(f'over the {args.budget:.1f} ms budget')
+        exit(1)
@@ -0,0 +1,75 @@
+from argparse   import ArgumentParser
+from pathlib    import Path
+from random     import Random
+from statistics import median
+from tempfile   import TemporaryDirectory
+from time       import perf_counter, sleep
+from typing     import List
+
+from headless import run_headless
+run_headless()
+
+from fartpiano.cache    import SoundCache
+from fartpiano.pitch    import Pitch
+from fartpiano.prefetch import KeyHistory
+from fartpiano.sampler  import get_bank, read_banks
+from fartpiano.sound    import SoundManager, init_sound
+from fartpiano.utils    import get_default_bank_path
+
+def melody(keys: List[Pitch], notes: int, seed: int) -> List[Pitch]:
+    # A random walk in small steps around a few favourite keys, like someone noodling
+    random = Random(seed)
+    position = len(keys) // 2
+    played = []
+    for _ in range(notes):
+        position = min(max(position + random.choice((-2, -1, -1, 0, 1, 1, 2)), len(keys) // 3), 2 * len(keys) // 3)
+        played.append(keys[position])
+    return played
+
+def play(name: str, pitches: List[Pitch], budget: int, interval: float, prefetch: int, history: KeyHistory) -> None:
+    bank = get_bank()
+    cache = SoundCache(budget)
+    manager = SoundManager(bank, True, cache, prefetch=prefetch, history=history)
+    # Give the warm up from past sessions the time it would get while the player sits down
+    sleep(.2)
+
+    latencies = []
+    for pitch in pitches:
+        start = perf_counter()
+        manager.attack(pitch)
+        latencies.append(perf_counter() - start)
+        sleep(interval)
+        manager.release(pitch)
+    manager.close()
+
+    latencies.sort()
+    stats = cache.stats
+    print(f'{name:<18} hit rate {stats["hits"] / len(pitches) * 100:5.1f} %  misses {stats["misses"]:4}  evictions {stats["evictions"]:4}  '
+          f'prefetched {stats["prefetched"]:4}  attack p50 {median(latencies) * 1e3:6.3f} ms  p99 {latencies[int(len(latencies) * .99) - 1] * 1e3:6.3f} ms')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Hit rate and note-on cost of lazily decoded banks with and without prefetching')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--notes', type=int, default=300)
+    parser.add_argument('--interval', type=float, default=.05)
+    parser.add_argument('--budget', type=float, default=.25, help='Cache budget as a fraction of the decoded bank')
+    args = parser.parse_args()
+
+    init_sound()
+    read_banks(args.banks, preload=True, cache_budget=None)
+    bank = get_bank()
+    keys = sorted(bank.samples)
+    budget = int(bank.cache.size * args.budget)
+    print(f'{bank}: {bank.cache.size / 1024:.0f} KB decoded, budget {budget / 1024:.0f} KB')
+
+    with TemporaryDirectory() as temp:
+        # An earlier session to learn the favourite keys from
+        history = KeyHistory(Path(temp)/'history.json')
+        for pitch in melody(keys, args.notes, 1):
+            history.record(pitch)
+        history.save()
+
+        pitches = melody(keys, args.notes, 2)
+        play('on demand', pitches, budget, args.interval, 0, None)
+        play('prefetch 2', pitches, budget, args.interval, 2, None)
+        play('prefetch 2 + warm', pitches, budget, args.interval, 2, KeyHistory(history.path))
@@ -0,0 +1,93 @@
+from argparse       import ArgumentParser
+from json           import loads
+from pathlib        import Path
+from tempfile       import TemporaryDirectory
+from time           import perf_counter, sleep
+from urllib.request import urlopen
+from mido           import Message
+
+from headless import run_headless
+run_headless()
+
+from fartpiano.metrics import JsonLinesExporter, MetricsRegistry, PrometheusExporter
+from fartpiano.midi    import MIDIDeviceManager, MIDIEventListener, MIDIEvent
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.sound   import SoundManager, init_sound
+from fartpiano.utils   import get_default_bank_path
+
+class UnmeteredManager(MIDIDeviceManager):
+    '''Dispatches the way the manager did before it kept metrics.'''
+
+    def _notify_listeners(self, event: MIDIEvent) -> None:
+        for listener in self._listeners:
+            listener.on_midi_event(event)
+
+class NullListener(MIDIEventListener):
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        pass
+
+def per_call(function, calls: int) -> float:
+    start = perf_counter()
+    for _ in range(calls):
+        function()
+    return (perf_counter() - start) / calls
+
+def dispatch(manager_type: type, messages: list, rounds: int) -> float:
+    manager = manager_type('unused', metrics=MetricsRegistry())
+    manager.add_listener(NullListener())
+    best = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        for message in messages:
+            manager._on_message(message)
+        best = min(best, (perf_counter() - start) / len(messages))
+    return best
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='What keeping and exporting the runtime metrics costs')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter('calls', 'Calls')
+    histogram = registry.histogram('seconds', 'Seconds')
+    print(f'counter inc        {per_call(counter.inc, args.calls) * 1e9:6.0f} ns')
+    print(f'histogram observe  {per_call(lambda: histogram.observe(3e-4), args.calls) * 1e9:6.0f} ns')
+    print(f'timed observe      {per_call(lambda: histogram.observe(perf_counter() - perf_counter()), args.calls) * 1e9:6.0f} ns')
+
+    messages = [Message('note_on' if i % 2 == 0 else 'note_off', note=40 + i % 40) for i in range(2000)]
+    unmetered = dispatch(UnmeteredManager, messages, 20)
+    metered = dispatch(MIDIDeviceManager, messages, 20)
+    print(f'dispatch           {unmetered * 1e9:6.0f} ns unmetered  {metered * 1e9:6.0f} ns metered  (+{(metered - unmetered) * 1e9:.0f} ns per note)')
+
+    # A live sound manager so every gauge has something to read
+    init_sound()
+    read_banks(args.banks, preload=True)
+    bank = get_bank()
+    registry = MetricsRegistry()
+    manager = SoundManager(bank, True, metrics=registry)
+    for sample in list(bank.playable())[:8]:
+        manager.attack(sample.pitch)
+    sleep(.1)
+    print(f'snapshot           {per_call(registry.snapshot, 2000) * 1e6:6.1f} us for {len(list(registry))} metrics')
+    print(f'prometheus text    {per_call(registry.to_prometheus, 2000) * 1e6:6.1f} us')
+
+    exporter = PrometheusExporter(registry, 0)
+    exporter.start()
+    body = urlopen(f'http://127.0.0.1:{exporter.port}/metrics').read().decode()
+    exporter.stop()
+    print(f'endpoint           {len(body.splitlines())} lines, active voices line: '
+          f'{next(line for line in body.splitlines() if line.startswith("fartpiano_active_voices"))}')
+
+    with TemporaryDirectory() as temp:
+        lines = JsonLinesExporter(registry, Path(temp)/'metrics.jsonl', .05)
+        lines.start()
+        sleep(.22)
+        lines.stop()
+        lines.join()
+        written = (Path(temp)/'metrics.jsonl').read_text().splitlines()
+        last = loads(written[-1])
+        print(f'json lines         {len(written)} lines, notes attacked {last["notes_attacked"]}, attack p50 {last["attack_seconds"]["p50"]} s')
+    manager.close()
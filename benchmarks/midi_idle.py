@@ -0,0 +1,64 @@
+from argparse   import ArgumentParser
+from statistics import median
+from time       import perf_counter, process_time, sleep
+from typing     import List
+from mido       import Message
+
+from fartpiano.midi import MIDIDeviceManager, MIDIEventListener, MIDIEvent
+
+from scripted_port import PortRegistry, play_script
+
+class SpinningManager(MIDIDeviceManager):
+    '''The polling loop the manager used before it switched to port callbacks.'''
+
+    def run(self) -> None:
+        self._running = True
+        with self._opener(self._matcher.patterns[0]) as midi_in:
+            while self._running:
+                for msg in midi_in.iter_pending():
+                    self._on_message(msg)
+
+class LatencyListener(MIDIEventListener):
+
+    def __init__(self) -> None:
+        self.sent: List[float] = []
+        self.latencies: List[float] = []
+
+    def on_sent(self, message: Message) -> None:
+        self.sent.append(perf_counter())
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        self.latencies.append(perf_counter() - self.sent[len(self.latencies)])
+
+def measure(manager_type: type, idle: float, notes: int) -> None:
+    registry = PortRegistry()
+    listener = LatencyListener()
+    manager = manager_type('scripted', registry, lister=registry.list_names)
+    manager.add_listener(listener)
+    manager.start()
+    port = registry.wait_for_port()
+
+    # Idle cost, nothing is played
+    start_cpu = process_time()
+    sleep(idle)
+    idle_cpu = (process_time() - start_cpu) / idle * 100
+
+    # Press to dispatch latency with notes spaced out like a slow player
+    script = [(.01, Message('note_on' if i % 2 == 0 else 'note_off', note=60)) for i in range(notes)]
+    play_script(port, script, listener.on_sent).join()
+    sleep(.05)
+    manager.stop()
+    manager.join()
+
+    latencies = sorted(listener.latencies)
+    print(f'{manager_type.__name__:<18} idle cpu {idle_cpu:5.1f} %  dispatch median {median(latencies) * 1e6:7.1f} us  '
+          f'p99 {latencies[int(len(latencies) * .99) - 1] * 1e6:7.1f} us  n={len(latencies)}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Idle CPU and dispatch latency of the MIDI input loop')
+    parser.add_argument('--idle', type=float, default=3.0)
+    parser.add_argument('--notes', type=int, default=200)
+    args = parser.parse_args()
+
+    measure(SpinningManager, args.idle, args.notes)
+    measure(MIDIDeviceManager, args.idle, args.notes)
@@ -0,0 +1,125 @@
+from argparse  import ArgumentParser
+from json      import dumps
+from pathlib   import Path
+from tempfile  import TemporaryDirectory
+from time      import perf_counter, sleep
+from typing    import List
+from mido      import Message
+
+from headless import run_headless
+run_headless()
+
+from fartpiano.journal import JournalReplay, JournalWriter, JOURNAL_RECORD
+from fartpiano.metrics import MetricsRegistry, get_metrics
+from fartpiano.midi    import MIDIDeviceManager, MIDIEventListener, MIDIEvent
+from fartpiano.piano   import Piano
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.utils   import get_default_bank_path
+
+from scripted_port import PortRegistry, play_script
+
+class NullListener(MIDIEventListener):
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        pass
+
+class TimedListener(MIDIEventListener):
+    '''Times how long the piano takes over every event.'''
+
+    def __init__(self, listener: MIDIEventListener) -> None:
+        self._listener = listener
+        self.times: List[float] = []
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        start = perf_counter()
+        self._listener.on_midi_event(event)
+        self.times.append(perf_counter() - start)
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+def dispatch(journal: JournalWriter, messages: list, rounds: int) -> float:
+    manager = MIDIDeviceManager('unused', metrics=MetricsRegistry(), journal=journal)
+    manager.add_listener(NullListener())
+    best = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        for message in messages:
+            manager._on_message(message)
+        best = min(best, (perf_counter() - start) / len(messages))
+    return best
+
+def session(notes: List[int], count: int) -> list:
+    # A trill on one keyboard against chords on another, with a program change part way through
+    trill, chords = [], []
+    for index in range(count):
+        note = notes[len(notes) // 2 + index % 2]
+        trill += [(.012, Message('note_on', note=note, velocity=100)), (.012, Message('note_off', note=note))]
+    for index in range(count // 8):
+        chord = [notes[(index + step * 3) % len(notes)] for step in range(4)]
+        chords += [(.09 if step == 0 else 0, Message('note_on', channel=1, note=note, velocity=80)) for step, note in enumerate(chord)]
+        chords += [(.09 if step == 0 else 0, Message('note_off', channel=1, note=note)) for step, note in enumerate(chord)]
+    chords.insert(len(chords) // 2, (0, Message('program_change', channel=1, program=0)))
+    return [trill, chords]
+
+def record(path: Path, piano: Piano, scripts: list) -> int:
+    registry = PortRegistry(['Trill keyboard', 'Chord keyboard'])
+    journal = JournalWriter(path)
+    manager = MIDIDeviceManager('*', registry, lister=registry.list_names, rescan=0, journal=journal, queue_size=64)
+    manager.add_listener(piano)
+    manager.start()
+    while len(manager.ports) < 2:
+        sleep(.001)
+    feeders = [play_script(registry.opened(name), script) for name, script in zip(registry.names, scripts)]
+    for feeder in feeders:
+        feeder.join()
+    manager.stop()
+    manager.join()
+    journal.close()
+    return journal.records
+
+def replay(path: Path, piano: Piano, speed: float) -> None:
+    before = get_metrics().snapshot()
+    listener = TimedListener(piano)
+    journal = JournalReplay(path, speed, lambda: manager.stop())
+    manager = MIDIDeviceManager('*', journal.open, lister=journal.list_names, rescan=0)
+    manager.add_listener(listener)
+    journal.start()
+    start = perf_counter()
+    manager.run()
+    took = perf_counter() - start
+    after = get_metrics().snapshot()
+
+    late = f'late p50 {percentile(journal.lateness, .5) * 1e3:6.3f} ms max {max(journal.lateness) * 1e3:6.3f} ms' if journal.lateness else 'as fast as possible      '
+    print(f'replay {"max" if not speed else f"{speed:g}x":>4}  {journal.messages} messages of {journal.duration:.2f} s in {took:6.3f} s  '
+          f'{journal.messages / took:9,.0f} msg/s  {late}  piano p50 {percentile(listener.times, .5) * 1e6:5.0f} us '
+          f'p99 {percentile(listener.times, .99) * 1e6:6.0f} us  notes {after["notes_attacked"] - before["notes_attacked"]}  '
+          f'switches {after["bank_switches"] - before["bank_switches"]}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='What recording a MIDI journal costs and how fast one replays through the piano')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    messages = [Message('note_on' if i % 2 == 0 else 'note_off', note=40 + i % 40, velocity=64) for i in range(2000)]
+    with TemporaryDirectory() as temp:
+        plain = dispatch(None, messages, 20)
+        recorded = dispatch(JournalWriter(Path(temp)/'dispatch.fpj'), messages, 20)
+        json_size = sum(len(dumps({'time': 1234.567891, 'port': None, 'message': message.hex()})) + 1 for message in messages)
+        print(f'dispatch  {plain * 1e9:5.0f} ns plain  {recorded * 1e9:5.0f} ns recorded  (+{(recorded - plain) * 1e9:.0f} ns per message)  '
+              f'{JOURNAL_RECORD.size} bytes per message against {json_size / len(messages):.0f} as json lines')
+
+        read_banks(args.banks, preload=True)
+        bank = get_bank()
+        piano = Piano(bank, banks=[bank])
+        notes = sorted(pitch.midi for pitch in bank.zones)
+        path = Path(temp)/'session.fpj'
+        records = record(path, piano, session(notes, args.count))
+        print(f'recorded  {records} messages from 2 keyboards into {path.stat().st_size} bytes')
+
+        for speed in (1, 4, 16, 0):
+            replay(path, piano, speed)
+            sleep(.3)
+        piano.close()
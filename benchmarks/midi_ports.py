@@ -0,0 +1,116 @@
+from argparse   import ArgumentParser
+from statistics import median
+from threading  import Lock
+from time       import perf_counter, sleep
+from typing     import Dict, List, Set, Tuple
+from mido       import Message
+
+from fartpiano.metrics import MetricsRegistry
+from fartpiano.midi    import MIDIDeviceManager, MIDIEventListener, MIDIEvent, MIDIEventType
+
+from scripted_port import PortRegistry, play_script
+
+class RecordingListener(MIDIEventListener):
+    '''Times every event from when it was sent and keeps track of the keys held on each keyboard.'''
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.sent: Dict[Tuple[str, int, int], float] = {}
+        self.latencies: List[float] = []
+        self.held: Dict[str, Set[int]] = {}
+        self.sources: Set[Tuple[str, int]] = set()
+
+    def on_send(self, source: str):
+        def sent(message: Message) -> None:
+            with self._lock:
+                self.sent[(source, message.channel, message.note)] = perf_counter()
+        return sent
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        now = perf_counter()
+        with self._lock:
+            sent = self.sent.pop((event.source, event.channel, event.note.midi), None)
+        if sent is not None:
+            self.latencies.append(now - sent)
+        self.sources.add((event.source, event.channel))
+        held = self.held.setdefault(event.source, set())
+        if event.event == MIDIEventType.PRESS:
+            held.add(event.note.midi)
+        else:
+            held.discard(event.note.midi)
+
+def scales(channel: int, notes: int, spacing: float, low: int) -> list:
+    script = []
+    for index in range(notes):
+        note = low + index % 24
+        script.append((spacing, Message('note_on', channel=channel, note=note, velocity=90)))
+        script.append((spacing, Message('note_off', channel=channel, note=note)))
+    return script
+
+def wait_for(condition, timeout: float = 10.0) -> float:
+    start = perf_counter()
+    while not condition():
+        if perf_counter() - start > timeout:
+            raise TimeoutError('gave up waiting')
+        sleep(.0005)
+    return perf_counter() - start
+
+def keyboards(count: int, notes: int, spacing: float, rescan: float) -> None:
+    names = [f'Keyboard {index} MIDI 1' for index in range(count)]
+    registry = PortRegistry(names + ['Midi Through Port-0'])
+    metrics = MetricsRegistry()
+    listener = RecordingListener()
+    manager = MIDIDeviceManager('Keyboard*', registry, metrics, lister=registry.list_names, rescan=rescan)
+    manager.add_listener(listener)
+    manager.start()
+    wait_for(lambda: len(manager.ports) == count)
+
+    feeders = [play_script(registry.opened(name), scales(index % 16, notes, spacing, 36 + 12 * (index % 4)), listener.on_send(name))
+               for index, name in enumerate(names)]
+    for feeder in feeders:
+        feeder.join()
+    manager.stop()
+    manager.join()
+
+    latencies = sorted(listener.latencies)
+    print(f'{count} keyboards  events {len(latencies):5}  dispatch p50 {median(latencies) * 1e6:6.1f} us  p99 {latencies[int(len(latencies) * .99) - 1] * 1e6:7.1f} us  '
+          f'sources seen {len(listener.sources)}  through port read {"Midi Through Port-0" in manager.ports}')
+
+def hot_plug(rescan: float) -> None:
+    registry = PortRegistry(['LPK25 mk2 0'])
+    metrics = MetricsRegistry()
+    listener = RecordingListener()
+    manager = MIDIDeviceManager(['LPK25*', r're:^MPK mini \d'], registry, metrics, lister=registry.list_names, rescan=rescan)
+    manager.add_listener(listener)
+    manager.start()
+    wait_for(lambda: len(manager.ports) == 1)
+
+    # Plug in a second keyboard and time until it can play
+    registry.names.append('MPK mini 3')
+    plugged = wait_for(lambda: 'MPK mini 3' in manager.ports)
+    mpk = registry.opened('MPK mini 3')
+    for note in (60, 64, 67):
+        mpk.send(Message('note_on', note=note, velocity=80))
+    held = sorted(listener.held['MPK mini 3'])
+
+    # Pull it out with the chord still held
+    registry.names.remove('MPK mini 3')
+    unplugged = wait_for(lambda: 'MPK mini 3' not in manager.ports)
+    manager.stop()
+    manager.join()
+
+    snapshot = metrics.snapshot()
+    print(f'hot plug (rescan {rescan:.2f} s)  opened after {plugged * 1e3:6.1f} ms  closed after {unplugged * 1e3:6.1f} ms  '
+          f'held when unplugged {held}  stuck after {sorted(listener.held["MPK mini 3"])}  '
+          f'ports opened {snapshot["midi_ports_opened"]} closed {snapshot["midi_ports_closed"]}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='One manager reading several keyboards, and keyboards coming and going')
+    parser.add_argument('--notes', type=int, default=200)
+    parser.add_argument('--spacing', type=float, default=.005)
+    parser.add_argument('--rescan', type=float, default=.25)
+    args = parser.parse_args()
+
+    for count in (1, 2, 4, 8):
+        keyboards(count, args.notes, args.spacing, args.rescan)
+    hot_plug(args.rescan)
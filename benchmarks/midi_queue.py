@@ -0,0 +1,87 @@
+from argparse   import ArgumentParser
+from statistics import median
+from time       import perf_counter, sleep
+from typing     import Dict, List
+from mido       import Message
+
+from fartpiano.metrics import MetricsRegistry
+from fartpiano.midi    import MIDIDeviceManager, MIDIEventListener, MIDIEvent, MIDIEventType, OverflowPolicy
+
+from scripted_port import PortRegistry, play_script
+
+class SlowListener(MIDIEventListener):
+    '''Takes as long over a key press as a note whose sample has to be decoded first.'''
+
+    def __init__(self, press_time: float) -> None:
+        self._press_time = press_time
+        self.held: Dict[int, bool] = {}
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        if event.event == MIDIEventType.PRESS:
+            sleep(self._press_time)
+        self.held[event.note.midi] = event.event == MIDIEventType.PRESS
+
+class Probe(object):
+    '''Times how long the port's thread is kept busy by each message.'''
+
+    def __init__(self, manager: MIDIDeviceManager) -> None:
+        self.reads: List[float] = []
+        on_message = manager._on_message
+
+        def timed(msg: Message, *source) -> None:
+            start = perf_counter()
+            on_message(msg, *source)
+            self.reads.append(perf_counter() - start)
+        manager._on_message = timed
+
+def glissando(notes: int, spacing: float) -> list:
+    # Quick taps up the keyboard, each key let go before the next is pressed
+    script = []
+    for index in range(notes):
+        note = 40 + index % 48
+        script.append((spacing, Message('note_on', note=note, velocity=90)))
+        script.append((spacing / 2, Message('note_off', note=note)))
+    return script
+
+def run(label: str, queue_size: int, overflow: OverflowPolicy, coalesce: bool, script: list, press_time: float) -> None:
+    registry = PortRegistry()
+    metrics = MetricsRegistry()
+    manager = MIDIDeviceManager('scripted', registry, metrics, queue_size, overflow, coalesce, registry.list_names)
+    listener = SlowListener(press_time)
+    manager.add_listener(listener)
+    probe = Probe(manager)
+    manager.start()
+    port = registry.wait_for_port()
+
+    start = perf_counter()
+    play_script(port, script).join()
+    sent = perf_counter() - start
+    # Give the listener time to catch up with whatever is still queued
+    while metrics.snapshot()['midi_queue_depth']:
+        sleep(.005)
+    caught_up = perf_counter() - start
+    manager.stop()
+    manager.join()
+
+    snapshot = metrics.snapshot()
+    reads = sorted(probe.reads)
+    stuck = sum(listener.held.values())
+    print(f'{label:<26} port busy p50 {median(reads) * 1e6:7.0f} us max {reads[-1] * 1e3:6.1f} ms  script took {sent:5.2f} s  '
+          f'all handled after {caught_up:5.2f} s  high water {snapshot["midi_queue_high_water"]:3}  dropped {snapshot.get("midi_events_dropped", 0):4}  '
+          f'coalesced {snapshot.get("midi_events_coalesced", 0):4}  stuck notes {stuck}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='How a slow listener holds up the port, with and without listener queues')
+    parser.add_argument('--notes', type=int, default=200)
+    parser.add_argument('--spacing', type=float, default=.004, help='Seconds between a press and the next key')
+    parser.add_argument('--press-time', type=float, default=.01, help='Seconds the listener takes over a press')
+    parser.add_argument('--queue', type=int, default=16)
+    args = parser.parse_args()
+
+    script = glissando(args.notes, args.spacing)
+    run('direct', 0, OverflowPolicy.BLOCK, False, script, args.press_time)
+    run('queue block', args.queue, OverflowPolicy.BLOCK, False, script, args.press_time)
+    run('queue block coalesce', args.queue, OverflowPolicy.BLOCK, True, script, args.press_time)
+    run('queue drop-oldest', args.queue, OverflowPolicy.DROP_OLDEST, False, script, args.press_time)
+    run('queue drop-newest', args.queue, OverflowPolicy.DROP_NEWEST, False, script, args.press_time)
+    run('queue drop-oldest coalesce', args.queue, OverflowPolicy.DROP_OLDEST, True, script, args.press_time)
@@ -0,0 +1,54 @@
+from argparse     import ArgumentParser
+from pathlib      import Path
+from statistics   import median
+from time         import perf_counter, sleep
+from typing       import List, Tuple
+
+from headless import run_headless
+run_headless()
+
+from pygame.mixer import get_busy
+
+from fartpiano.cache   import SoundCache
+from fartpiano.pitch   import Pitch
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.sound   import SoundManager, init_sound
+from fartpiano.utils   import get_default_bank_path
+
+def measure(manager: SoundManager, rounds: int) -> Tuple[List[float], List[float]]:
+    dispatch = []
+    play = []
+    for _ in range(rounds):
+        for pitch in Pitch.iterate():
+            start = perf_counter()
+            manager.attack(pitch)
+            dispatch.append(perf_counter() - start)
+            while not get_busy():
+                sleep(0)
+            play.append(perf_counter() - start)
+            manager.release(pitch)
+            while get_busy():
+                sleep(0.001)
+    return dispatch, play
+
+def report(name: str, latencies: Tuple[List[float], List[float]]) -> None:
+    for stage, values in zip(('dispatch', 'play'), latencies):
+        values = sorted(values)
+        p99 = values[int(len(values) * .99) - 1]
+        print(f'{name:<10} {stage:<9} n={len(values):<5} median={median(values) * 1e3:.3f} ms  p99={p99 * 1e3:.3f} ms  max={values[-1] * 1e3:.3f} ms')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Note-on to play latency of the SoundManager with and without the sample cache')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    init_sound()
+    read_banks(args.banks, preload=True)
+    bank = get_bank()
+
+    # A zero byte budget never keeps anything, which is the decode on every press behaviour
+    for name, cache in (('uncached', SoundCache(0)), ('preloaded', None)):
+        manager = SoundManager(bank, True, cache)
+        report(name, measure(manager, args.rounds))
+        manager.close()
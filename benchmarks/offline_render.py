@@ -0,0 +1,72 @@
+from argparse  import ArgumentParser
+from pathlib   import Path
+from random    import Random
+from tempfile  import TemporaryDirectory
+from time      import perf_counter
+from mido      import Message, MidiFile, MidiTrack, MetaMessage, bpm2tempo
+from soundfile import info
+
+from fartpiano.engine  import SAMPLE_RATE, BLOCK_SIZE
+from fartpiano.render  import RENDER_BLOCK_SIZE, render_midi
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.utils   import get_default_bank_path
+
+def piece(path: Path, minutes: float, bpm: int, seed: int) -> int:
+    # A melody in eighth notes over held chords, with the odd note ended by a zero velocity note on
+    random = Random(seed)
+    midi = MidiFile(ticks_per_beat=480)
+    track = MidiTrack()
+    midi.tracks.append(track)
+    track.append(MetaMessage('set_tempo', tempo=bpm2tempo(bpm)))
+
+    notes = 0
+    melody = 72
+    pending = 0
+    for _ in range(int(minutes * bpm / 4)):
+        root = random.choice((48, 53, 55, 57))
+        chord = (root, root + 4, root + 7)
+        for note in chord:
+            track.append(Message('note_on', note=note, velocity=80, time=pending))
+            pending = 0
+        notes += len(chord)
+        for _ in range(8):
+            melody = min(max(melody + random.choice((-3, -2, -1, 1, 2, 3)), 60), 84)
+            track.append(Message('note_on', note=melody, velocity=90, time=pending))
+            off = 'note_on' if random.random() < .5 else 'note_off'
+            track.append(Message(off, note=melody, velocity=0, time=240))
+            notes += 1
+        for note in chord:
+            track.append(Message('note_off', note=note, velocity=0, time=0))
+    midi.save(path)
+    return notes
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='How much faster than real time a midi file renders through a bank')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--minutes', type=float, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    read_banks(args.banks)
+    bank = get_bank()
+
+    with TemporaryDirectory() as temp:
+        midi_path = Path(temp)/'piece.mid'
+        notes = piece(midi_path, args.minutes, 120, 1)
+        print(f'{bank}: {args.minutes:.0f} minute piece with {notes} notes')
+
+        for single_loop in (False, True):
+            for block_size in (BLOCK_SIZE, RENDER_BLOCK_SIZE):
+                for suffix in ('.wav', '.flac'):
+                    output = Path(temp)/f'piece{suffix}'
+                    timings = []
+                    for _ in range(args.runs):
+                        # Overwriting a file can cost more than rendering into it, start from nothing each run
+                        output.unlink(missing_ok=True)
+                        start = perf_counter()
+                        frames = render_midi(midi_path, bank, output, single_loop, block_size=block_size)
+                        timings.append(perf_counter() - start)
+                    elapsed = min(timings)
+                    assert info(str(output)).frames == frames
+                    print(f'single_loop={single_loop!s:<5} block={block_size:<5} {suffix:<5} {frames / SAMPLE_RATE:6.1f} s of audio in '
+                          f'{elapsed:5.2f} s  {frames / SAMPLE_RATE / elapsed:6.0f}x real time')
@@ -0,0 +1,69 @@
+from argparse        import ArgumentParser
+from time            import perf_counter
+from typing          import Callable, Tuple
+from numpy           import arange, array, concatenate, cumsum, log2, mean, median, ndarray, pi, sin, float32
+from numpy.random    import default_rng
+from librosa         import piptrack
+from librosa.effects import pitch_shift
+
+from fartpiano.analysis import correct_audio, detect_dominant_pitch
+from fartpiano.detect   import PiptrackDetector
+from fartpiano.pitch    import Pitch
+
+# The segment loops that analysis used before it moved to a single pitch track,
+# kept here so the benchmark has something to compare against
+def loop_dominant_pitch(y: ndarray, sr: int, segment_duration: float = .1) -> Pitch:
+    segment_samples = int(segment_duration * sr)
+    pitches = []
+    for start in range(0, len(y) - segment_samples, segment_samples):
+        pitches_segment, _ = piptrack(y=y[start:start + segment_samples], sr=sr)
+        pitches_segment = pitches_segment[pitches_segment > 0]
+        if len(pitches_segment) > 0:
+            pitches.append(mean(pitches_segment))
+    return Pitch.from_frequency(median(pitches))
+
+def loop_correct_audio(y: ndarray, sr: int, segment_duration: float = .1) -> Tuple[ndarray, Pitch]:
+    dominant_pitch = loop_dominant_pitch(y, sr, segment_duration * 4)
+    corrected_audio = array([])
+    for start in arange(0, len(y) / sr, segment_duration):
+        segment_audio = y[int(start * sr):int((start + segment_duration) * sr)]
+        pitches, _ = piptrack(y=segment_audio, sr=sr)
+        pitches = pitches[pitches > 0]
+        if len(pitches) > 0:
+            segment_audio = pitch_shift(y=segment_audio, sr=sr, n_steps=log2(dominant_pitch.frequency / median(pitches)) * 12)
+        corrected_audio = concatenate((corrected_audio, segment_audio))
+    return corrected_audio, dominant_pitch
+
+def recording(duration: float, sr: int) -> ndarray:
+    # A wobbly sawtooth-ish tone around D4 with some breath noise
+    t = arange(int(duration * sr)) / sr
+    frequency = 293.66 * (1 + .02 * sin(2 * pi * .7 * t))
+    phase = 2 * pi * cumsum(frequency) / sr
+    noise = default_rng(0).standard_normal(len(t))
+    return (.4 * sin(phase) + .2 * sin(2 * phase) + .1 * sin(3 * phase) + .02 * noise).astype(float32)
+
+def timed(function: Callable, *args) -> Tuple[float, object]:
+    start = perf_counter()
+    result = function(*args)
+    return perf_counter() - start, result
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Scaling of dominant pitch detection and pitch correction with recording length')
+    parser.add_argument('--durations', type=float, nargs='+', default=[15, 30, 60])
+    parser.add_argument('--sr', type=int, default=44100)
+    args = parser.parse_args()
+
+    # Both sides use piptrack so only the structure of the analysis differs
+    detector = PiptrackDetector()
+
+    # Warm up numba and the FFT plans before timing anything
+    correct_audio(recording(1, args.sr), args.sr, detector=detector)
+
+    for duration in args.durations:
+        y = recording(duration, args.sr)
+        loop_detect, loop_pitch = timed(loop_dominant_pitch, y, args.sr, .4)
+        track_detect, track_pitch = timed(detect_dominant_pitch, y, args.sr, .4, detector)
+        loop_correct, _ = timed(loop_correct_audio, y, args.sr)
+        track_correct, _ = timed(correct_audio, y, args.sr, .1, .01, detector)
+        print(f'{duration:5.0f} s  detect: loop {loop_detect:7.2f} s ({loop_pitch})  track {track_detect:7.2f} s ({track_pitch})'
+              f'  correct: loop {loop_correct:7.2f} s  track {track_correct:7.2f} s')
@@ -0,0 +1,55 @@
+from argparse     import ArgumentParser
+from time         import perf_counter
+from typing       import Callable, Dict, List
+from numpy        import abs as np_abs, arange, log2, mean, median, ndarray, pi, sin, zeros
+
+from fartpiano.detect import PITCH_DETECTORS, get_pitch_detector
+from fartpiano.pitch  import Pitch
+
+def sine(frequency: float, duration: float, sr: int) -> ndarray:
+    return .5 * sin(2 * pi * frequency * arange(int(duration * sr)) / sr)
+
+def sawtooth(frequency: float, duration: float, sr: int) -> ndarray:
+    # Band limited so the high pitches don't alias back under the fundamental
+    t = arange(int(duration * sr)) / sr
+    y = zeros(len(t))
+    harmonic = 1
+    while harmonic * frequency < sr / 2:
+        y += sin(2 * pi * harmonic * frequency * t) / harmonic
+        harmonic += 1
+    return .3 * y
+
+WAVEFORMS: Dict[str, Callable] = {
+    'sine': sine,
+    'sawtooth': sawtooth,
+}
+
+def cents(detected: float, expected: float) -> float:
+    return 1200 * log2(detected / expected)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Accuracy and speed of the pitch detectors over the range the banks cover')
+    parser.add_argument('--duration', type=float, default=.5)
+    parser.add_argument('--sr', type=int, default=44100)
+    args = parser.parse_args()
+
+    for waveform, generate in WAVEFORMS.items():
+        tones = [(pitch, generate(pitch.frequency, args.duration, args.sr)) for pitch in Pitch.iterate()]
+        for name in PITCH_DETECTORS:
+            detector = get_pitch_detector(name)
+            detector.track(tones[0][1], args.sr)
+
+            errors: List[float] = []
+            elapsed = 0.0
+            for pitch, y in tones:
+                start = perf_counter()
+                values, _ = detector.track(y, args.sr)
+                elapsed += perf_counter() - start
+                # Pitch correction takes the median of every value a segment produced
+                errors.append(cents(median(values), pitch.frequency) if len(values) else float('inf'))
+
+            errors = np_abs(errors)
+            right_note = mean(errors < 50) * 100
+            finite = errors[errors < float('inf')]
+            print(f'{waveform:<9} {name:<9} {elapsed / len(tones) * 1e3:7.2f} ms/tone  median error {median(finite):8.2f} cents  '
+                  f'worst {finite.max():8.1f} cents  right note {right_note:5.1f} %')
@@ -0,0 +1,38 @@
+from argparse import ArgumentParser
+from random   import Random
+from timeit   import timeit
+
+from fartpiano.midi  import MIDIEvent, MIDIEventType
+from fartpiano.pitch import Note, Pitch
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Throughput of the pitch lookups made for every incoming MIDI message')
+    parser.add_argument('--events', type=int, default=200000)
+    args = parser.parse_args()
+
+    random = Random(0)
+    numbers = [random.randrange(45, 109) for _ in range(args.events)]
+    samples = {pitch: str(pitch) for pitch in Pitch.iterate()}
+    notes = list(Note)
+
+    def from_midi() -> None:
+        for number in numbers:
+            Pitch.from_midi(number)
+
+    def bank_lookup() -> None:
+        for number in numbers:
+            samples[Pitch.from_midi(number)]
+
+    def midi_event() -> None:
+        for number in numbers:
+            samples[MIDIEvent(MIDIEventType.PRESS, number, 100).note]
+
+    def note_arithmetic() -> None:
+        for number in numbers:
+            note = notes[number % 12]
+            note + 1 > note
+
+    for name, run in (('from_midi', from_midi), ('from_midi + bank lookup', bank_lookup),
+                      ('MIDIEvent + bank lookup', midi_event), ('Note add + compare', note_arithmetic)):
+        seconds = min(timeit(run, number=1) for _ in range(3))
+        print(f'{name:<24} {args.events / seconds / 1e6:6.2f} M/s  {seconds / args.events * 1e9:7.1f} ns each')
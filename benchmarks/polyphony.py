@@ -0,0 +1,45 @@
+from argparse   import ArgumentParser
+from pathlib    import Path
+from statistics import median
+from time       import perf_counter
+
+from fartpiano.engine  import VOICE_STEALERS, VoiceEngine, get_voice_stealer, SAMPLE_RATE, BLOCK_SIZE
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.utils   import get_default_bank_path
+
+def glissando(engine: VoiceEngine, bank, sweeps: int, keys_per_block: int) -> dict:
+    # Runs up and down the keyboard letting go of every key right away, in single loop mode
+    # every note plays out in full so they pile up behind the sweep
+    keys = sorted(bank.playable(), key=lambda sample: sample.pitch)
+    keys = (keys + keys[-2:0:-1]) * sweeps
+
+    timings = []
+    peak = 0
+    for index in range(0, len(keys), keys_per_block):
+        for sample in keys[index:index + keys_per_block]:
+            engine.attack(sample.pitch, bank.cache.get(sample), True)
+            engine.release(sample.pitch)
+        start = perf_counter()
+        engine.render()
+        timings.append(perf_counter() - start)
+        peak = max(peak, engine.active_voices)
+    timings.sort()
+    return {'peak': peak, 'p50': median(timings), 'max': timings[-1], **engine.stats}
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Render cost and stolen voices of a fast glissando with and without a polyphony cap')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--sweeps', type=int, default=4)
+    parser.add_argument('--keys-per-block', type=int, default=2, help='Keys pressed every block, 2 is about 170 a second')
+    parser.add_argument('--voices', type=int, default=16)
+    args = parser.parse_args()
+
+    read_banks(args.banks, preload=True)
+    bank = get_bank()
+    block_period = BLOCK_SIZE / SAMPLE_RATE
+
+    runs = [('uncapped', 1024, 'oldest')] + [(name, args.voices, name) for name in VOICE_STEALERS]
+    for label, voices, policy in runs:
+        result = glissando(VoiceEngine(voices, stealer=get_voice_stealer(policy)), bank, args.sweeps, args.keys_per_block)
+        print(f'{label:<10} voices={voices:<5} peak={result["peak"]:<4} render p50 {result["p50"] * 1e6:7.1f} us  max {result["max"] * 1e6:7.1f} us '
+              f'({result["max"] / block_period * 100:5.1f} % of a block)  stolen {result["stolen"]:4}  dropped {result["dropped"]:4}')
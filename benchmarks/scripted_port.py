@@ -0,0 +1,59 @@
+from collections import deque
+from threading   import Thread
+from time        import perf_counter, sleep
+from typing      import Callable, Iterable, List, Optional, Tuple
+from mido        import Message
+from mido.ports  import BaseInput
+
+class ScriptedPort(BaseInput):
+    '''An in-process input port, messages sent to it are delivered like a hardware port would.'''
+
+    def _open(self, callback: Optional[Callable[[Message], None]] = None, **kwargs) -> None:
+        self.callback = callback
+
+    def send(self, message: Message) -> None:
+        if self.callback:
+            self.callback(message)
+        else:
+            with self._lock:
+                self._messages.append(message)
+
+class PortRegistry(object):
+    '''Stands in for mido.open_input and mido.get_input_names and remembers the ports it opened.'''
+
+    def __init__(self, names: Iterable[str] = ('scripted',)) -> None:
+        self.ports = deque()
+        # The ports that are plugged in, change it to plug and unplug them
+        self.names = list(names)
+
+    def __call__(self, name: str, **kwargs) -> ScriptedPort:
+        port = ScriptedPort(name, **kwargs)
+        self.ports.append(port)
+        return port
+
+    def list_names(self) -> List[str]:
+        return list(self.names)
+
+    def opened(self, name: str) -> ScriptedPort:
+        return next(port for port in reversed(self.ports) if port.name == name and not port.closed)
+
+    def wait_for_port(self, timeout: float = 5.0) -> ScriptedPort:
+        start = perf_counter()
+        while not self.ports:
+            if perf_counter() - start > timeout:
+                raise TimeoutError('no port was opened')
+            sleep(0.001)
+        return self.ports[-1]
+
+def play_script(port: ScriptedPort, script: Iterable[Tuple[float, Message]], on_send: Callable[[Message], None] = None) -> Thread:
+    '''Sends (delay, message) pairs to the port from a background thread.'''
+    def feed() -> None:
+        for delay, message in script:
+            if delay > 0:
+                sleep(delay)
+            if on_send:
+                on_send(message)
+            port.send(message)
+    feeder = Thread(target=feed, daemon=True)
+    feeder.start()
+    return feeder
@@ -0,0 +1,78 @@
+from argparse   import ArgumentParser
+from pathlib    import Path
+from subprocess import Popen, PIPE
+from sys        import executable
+from time       import perf_counter
+from typing     import Dict, List, Optional
+
+from fartpiano.shared import BankServer
+from fartpiano.utils  import get_default_bank_path
+
+# Each client reads the banks like a piano does, plays every sample once so all of it is resident, then waits
+CLIENT = '''
+import sys
+from pathlib import Path
+from warnings import simplefilter
+simplefilter('ignore')
+from fartpiano.sampler import get_banks, read_banks
+shared = Path(sys.argv[2]) if sys.argv[2] else None
+read_banks(Path(sys.argv[1]), True, None, shared)
+total = 0
+for bank in get_banks():
+    for sample in bank.playable():
+        sounds = bank.cache.get(sample)
+        total += int(sounds.attack.sum()) + int(sounds.sustain.sum()) + int(sounds.decay.sum())
+print(len(get_banks()), flush=True)
+sys.stdin.read()
+'''
+
+def memory(pid: int) -> Dict[str, int]:
+    # Pss splits every shared page between the processes mapping it, so it adds up across processes
+    values = {}
+    for line in Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines()[1:]:
+        field, value = line.split(':')
+        values[field] = int(value.split()[0]) * 1024
+    return values
+
+def shared_memory_used() -> int:
+    for line in Path('/proc/meminfo').read_text().splitlines():
+        if line.startswith('Shmem:'):
+            return int(line.split()[1]) * 1024
+    return 0
+
+def clients(banks: Path, shared: Optional[Path], count: int) -> None:
+    start = perf_counter()
+    processes = [Popen([executable, '-c', CLIENT, str(banks), str(shared or '')], stdin=PIPE, stdout=PIPE, text=True) for _ in range(count)]
+    loaded = [process.stdout.readline().strip() for process in processes]
+    ready = perf_counter() - start
+    usage: List[Dict[str, int]] = [memory(process.pid) for process in processes]
+    for process in processes:
+        process.communicate('')
+
+    rss = sum(values['Rss'] for values in usage) / count
+    pss = sum(values['Pss'] for values in usage)
+    anonymous = sum(values['Anonymous'] for values in usage) / count
+    print(f'{"shared" if shared else "own copy":<8} {count:2} pianos, {loaded[0]} banks  ready after {ready:5.2f} s  '
+          f'rss per piano {rss / 2**20:6.1f} MB  private per piano {anonymous / 2**20:6.1f} MB  pss of all pianos {pss / 2**20:7.1f} MB')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Memory of several pianos on one host, each decoding its own banks or mapping a bank server\'s')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--shared', type=Path, default=Path('/dev/shm/fartpiano-benchmark'))
+    parser.add_argument('--pianos', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    for count in args.pianos:
+        clients(args.banks, None, count)
+
+    before = shared_memory_used()
+    server = BankServer(args.banks, args.shared)
+    start = perf_counter()
+    published = server.publish()
+    print(f'server   published {len(published)} banks in {perf_counter() - start:.2f} s, '
+          f'{sum(path.stat().st_size for path in published) / 2**20:.1f} MB of shared memory (+{(shared_memory_used() - before) / 2**20:.1f} MB)')
+    try:
+        for count in args.pianos:
+            clients(args.banks, args.shared, count)
+    finally:
+        server.close()
@@ -0,0 +1,61 @@
+from argparse  import ArgumentParser
+from time      import perf_counter
+from typing    import List
+from numpy     import abs as np_abs, arange, array, hanning, log2, mean, median, ndarray, pi, sin, zeros
+from numpy.fft import rfft
+
+from fartpiano.detect import YinDetector
+from fartpiano.pitch  import Note, Pitch
+from fartpiano.shift  import SHIFT_ENGINES, get_shift_engine
+
+def recording(pitch: Pitch, duration: float, sr: int) -> ndarray:
+    # A band limited sawtooth with a swell and fade, close enough to a corrected recording
+    t = arange(int(duration * sr)) / sr
+    y = zeros(len(t))
+    harmonic = 1
+    while harmonic * pitch.frequency < sr / 2:
+        y += sin(2 * pi * harmonic * pitch.frequency * t) / harmonic
+        harmonic += 1
+    envelope = (t / t[-1]) ** .25 * (1 - t / t[-1]) ** .5
+    return (.3 * y * envelope).astype('float32')
+
+def cents(detected: float, expected: float) -> float:
+    return 1200 * log2(detected / expected)
+
+def harmonic_energy(y: ndarray, pitch: Pitch, sr: int) -> float:
+    # Share of the energy in the middle of the sound that sits on the harmonics of the target pitch
+    middle = y[len(y) // 4:3 * len(y) // 4]
+    spectrum = np_abs(rfft(middle * hanning(len(middle)))) ** 2
+    bins = arange(len(spectrum)) * sr / len(middle)
+    distance = (bins / pitch.frequency) % 1
+    on_harmonic = (distance < .03) | (distance > .97)
+    return spectrum[on_harmonic].sum() / spectrum.sum()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Speed and quality of the shift engines over every pitch a bank is built for')
+    parser.add_argument('--duration', type=float, default=1.5)
+    parser.add_argument('--sr', type=int, default=44100)
+    args = parser.parse_args()
+
+    source = Pitch(Note.D, 4)
+    y = recording(source, args.duration, args.sr)
+    detector = YinDetector()
+
+    for name in SHIFT_ENGINES:
+        shifter = get_shift_engine(name)
+        errors: List[float] = []
+        purity: List[float] = []
+        lengths: List[float] = []
+        elapsed = 0.0
+        for pitch in Pitch.iterate():
+            start = perf_counter()
+            shifted = shifter.shift(y, args.sr, source, pitch)
+            elapsed += perf_counter() - start
+            values, _ = detector.track(shifted, args.sr)
+            errors.append(abs(cents(median(values), pitch.frequency)) if len(values) else float('inf'))
+            purity.append(harmonic_energy(shifted, pitch, args.sr))
+            lengths.append(len(shifted) / len(y))
+
+        errors = array(errors)
+        print(f'{name:<9} {elapsed:6.2f} s total  {elapsed / len(errors) * 1e3:6.1f} ms/pitch  median error {median(errors):5.2f} cents  '
+              f'worst {errors.max():6.1f} cents  harmonic energy {mean(purity) * 100:5.1f} %  length {min(lengths):.2f}-{max(lengths):.2f}x')
@@ -0,0 +1,55 @@
+from argparse   import ArgumentParser
+from pathlib    import Path
+from statistics import median
+from threading  import active_count
+from time       import perf_counter, sleep
+
+from headless import run_headless
+run_headless()
+
+from fartpiano.engine  import VoiceEngine, SAMPLE_RATE, BLOCK_SIZE
+from fartpiano.pitch   import Pitch
+from fartpiano.sampler import get_bank, read_banks
+from fartpiano.sound   import SoundManager, init_sound
+from fartpiano.utils   import get_default_bank_path
+
+def render_cost(bank, polyphony: int, blocks: int) -> float:
+    engine = VoiceEngine(polyphony)
+    pitches = list(Pitch.iterate())[:polyphony]
+    for pitch in pitches:
+        engine.attack(pitch, bank.cache.get(bank.samples[pitch]), False)
+
+    timings = []
+    for _ in range(blocks):
+        start = perf_counter()
+        engine.render()
+        timings.append(perf_counter() - start)
+    return median(timings)
+
+def thread_count(bank, polyphony: int) -> int:
+    manager = SoundManager(bank, False, voices=polyphony)
+    pitches = list(Pitch.iterate())[:polyphony]
+    for pitch in pitches:
+        manager.attack(pitch)
+    sleep(0.1)
+    threads = active_count()
+    manager.stop_all()
+    manager.close()
+    return threads
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Render cost and thread usage of the voice engine')
+    parser.add_argument('--banks', type=Path, default=get_default_bank_path())
+    parser.add_argument('--blocks', type=int, default=2000)
+    args = parser.parse_args()
+
+    init_sound()
+    read_banks(args.banks, preload=True)
+    bank = get_bank()
+
+    block_period = BLOCK_SIZE / SAMPLE_RATE
+    print(f'block: {BLOCK_SIZE} frames, {block_period * 1e3:.2f} ms, releases apply on the next block boundary')
+    for polyphony in (1, 4, 10, 16, 32):
+        cost = render_cost(bank, polyphony, args.blocks)
+        threads = thread_count(bank, polyphony)
+        print(f'voices={polyphony:<3} render={cost * 1e6:8.1f} us/block  load={cost / block_period * 100:5.1f} %  threads={threads}')
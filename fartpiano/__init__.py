@@ -1,2 +1,19 @@
-from .pitch  import analyze_dominant_pitch, correct_pitch, Pitch, Note
-from .sample import define_boundries, create_sample, Sample
\ No newline at end of file
+from importlib import import_module
+from typing    import Any
+
+from .pitch  import Pitch, Note
+from .sample import Sample, Bank
+
+# The analysis functions need librosa, they are imported the first time they are used
+_LAZY = {
+    'analyze_dominant_pitch': '.analysis',
+    'correct_pitch':          '.analysis',
+    'define_boundries':       '.analysis',
+    'create_sample':          '.analysis',
+    'create_bank':            '.builder',
+}
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        return getattr(import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__} has no attribute {name}')
@@ -1,26 +1,238 @@
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from pathlib  import Path
+from time     import perf_counter, sleep
 
-from .midi    import MIDIDeviceManager
-from .sampler import install_bank, get_bank, read_banks
-from .utils   import get_configuration, get_default_bank_path
-from .piano   import Piano
+from .midi     import MIDIDeviceManager, OverflowPolicy
+from .sampler  import install_bank, get_bank, get_banks, read_banks
+from .packed   import pack_bank
+from .utils    import get_configuration, get_default_bank_path, get_history_path, get_build_cache_path, get_shared_bank_path
+from .piano    import Piano
+from .prefetch import KeyHistory
+from .sound    import init_sound
+from .engine   import SAMPLE_RATE, CHANNELS, get_voice_stealer
+from .metrics  import JsonLinesExporter, PrometheusExporter, get_metrics
+from .journal  import JournalReplay, JournalWriter
 
 
+def play(args: Namespace) -> None:
+    # Several keyboards can be read at once, their names or patterns are separated by commas
+    midi_devices = get_configuration().get('devices', 'midi').split(',')
+    rescan = get_configuration().getfloat('devices', 'midi_rescan', fallback=2.0)
+    journal = None
+    journal_dir = get_configuration().get('devices', 'midi_journal', fallback='')
+    if journal_dir:
+        journal = JournalWriter.create(Path(journal_dir).expanduser())
+    device_manager = MIDIDeviceManager(midi_devices, rescan=rescan, journal=journal, **read_queue_settings())
+    try:
+        run_piano(device_manager)
+    finally:
+        if journal:
+            journal.close()
 
-if __name__ == "__main__":
-    parser = ArgumentParser(prog='FartSampler', description='TODO')
-    args = parser.parse_args()
+def replay(args: Namespace) -> None:
+    from statistics import median
+
+    def finished() -> None:
+        # Let the piano catch up with what's still queued and the last notes ring out
+        while get_metrics()['midi_queue_depth'].value:
+            sleep(.01)
+        sleep(args.tail)
+        device_manager.stop()
+
+    journal = JournalReplay(args.journal, args.speed, finished)
+    # Every port in the journal is read, the replay starts once they're all open
+    device_manager = MIDIDeviceManager('*', journal.open, lister=journal.list_names, rescan=0, **read_queue_settings())
+    journal.start()
+    start = perf_counter()
+    # A replay isn't real playing, so it's kept out of the key history
+    run_piano(device_manager, remember_keys=False)
+    took = perf_counter() - start
 
-    midi_device_name = get_configuration().get('devices', 'midi') 
-    device_manager = MIDIDeviceManager(midi_device_name)
+    snapshot = get_metrics().snapshot()
+    print(f'Replayed {journal.messages} messages, {journal.duration:.1f} s of playing, in {took:.1f} s')
+    if journal.lateness:
+        print(f'Messages sent late by p50 {median(journal.lateness) * 1e3:.3f} ms, max {max(journal.lateness) * 1e3:.3f} ms')
+    for name in ('midi_dispatch_seconds', 'attack_seconds', 'mixer_render_seconds'):
+        print(f'{name}: {snapshot[name]["count"]} observed, p50 <= {snapshot[name]["p50"]} s, p99 <= {snapshot[name]["p99"]} s')
+    for name in ('notes_attacked', 'notes_released', 'voices_stolen', 'voices_dropped', 'midi_events_dropped', 'midi_events_coalesced', 'mixer_underruns'):
+        print(f'{name}: {snapshot.get(name, 0)}')
 
+def read_queue_settings() -> dict:
+    return {'queue_size': get_configuration().getint('devices', 'midi_queue', fallback=64),
+            'overflow': OverflowPolicy(get_configuration().get('devices', 'midi_overflow', fallback='drop-oldest')),
+            'coalesce': get_configuration().getboolean('devices', 'midi_coalesce', fallback=True)}
+
+def read_shared_bank_path() -> Path:
+    shared_banks = get_configuration().get('piano', 'shared_banks', fallback='')
+    return Path(shared_banks).expanduser() if shared_banks else get_shared_bank_path()
+
+def run_piano(device_manager: MIDIDeviceManager, remember_keys: bool = True) -> None:
+    # The mixer has to be up before samples can be decoded into the cache
+    init_sound()
+    preload = get_configuration().getboolean('piano', 'preload', fallback=True)
+    cache_budget = get_configuration().getint('piano', 'cache_budget', fallback=0) * 1024 * 1024
     default_bank_dir = get_default_bank_path()
-    read_banks(default_bank_dir)
+    # Banks a bank server decoded into shared memory are mapped instead of decoded again
+    read_banks(default_bank_dir, False, cache_budget or None, read_shared_bank_path())
 
     single_loop = get_configuration().getboolean('piano', 'single_loop', fallback=False)
-    piano = Piano(get_bank(), single_loop)
+    prefetch = get_configuration().getint('piano', 'prefetch', fallback=2)
+    bank = get_bank(get_configuration().get('piano', 'bank', fallback='') or None)
+    # Only the bank that plays first is decoded up front, the others are decoded when a program change picks them
+    if preload:
+        bank.cache.preload(bank.playable())
+    history = None
+    if remember_keys and get_configuration().getboolean('piano', 'remember_keys', fallback=True):
+        history = KeyHistory(get_history_path()/f'{bank.name}.json')
+    voices = get_configuration().getint('piano', 'voices', fallback=16)
+    stealer = get_voice_stealer(get_configuration().get('piano', 'voice_stealing', fallback='oldest'))
+    piano = Piano(bank, single_loop, prefetch, history, voices, stealer, get_banks())
     device_manager.add_listener(piano)
 
-    device_manager.run()
-    device_manager.join()
-    
\ No newline at end of file
+    exporters = []
+    metrics_file = get_configuration().get('metrics', 'json_lines', fallback='')
+    if metrics_file:
+        interval = get_configuration().getfloat('metrics', 'interval', fallback=10)
+        exporters.append(JsonLinesExporter(get_metrics(), Path(metrics_file).expanduser(), interval))
+    metrics_port = get_configuration().getint('metrics', 'prometheus_port', fallback=0)
+    if metrics_port:
+        exporters.append(PrometheusExporter(get_metrics(), metrics_port))
+    for exporter in exporters:
+        exporter.start()
+
+    try:
+        # Runs on this thread until stopped
+        device_manager.run()
+    finally:
+        # Saves the keys played this session so the next one can warm them first
+        piano.close()
+        for exporter in exporters:
+            exporter.stop()
+            exporter.join()
+
+def build(args: Namespace) -> None:
+    # The build tools pull in librosa, keep them off the path to playing
+    from .builder    import create_bank
+    from .buildcache import BuildCache
+    from .detect     import get_pitch_detector
+    from .shift      import get_shift_engine
+    from .profiling  import BuildProfiler
+
+    workers = args.workers
+    if workers is None:
+        workers = get_configuration().getint('sampler', 'workers', fallback=0)
+    detector = args.pitch_detector or get_configuration().get('sampler', 'pitch_detector', fallback='yin')
+    rate = get_configuration().getint('sampler', 'sample_rate', fallback=SAMPLE_RATE)
+    channels = get_configuration().getint('sampler', 'channels', fallback=CHANNELS)
+    cache = None
+    if not args.no_cache and get_configuration().getboolean('sampler', 'build_cache', fallback=True):
+        cache_budget = get_configuration().getint('sampler', 'build_cache_budget', fallback=1024) * 1024 * 1024
+        cache = BuildCache(get_build_cache_path(), cache_budget or None)
+    zone_step = args.zone_step or get_configuration().getint('sampler', 'zone_step', fallback=1)
+    shift_engine = args.shift_engine or get_configuration().get('sampler', 'shift_engine', fallback='quality')
+    profiler = BuildProfiler(enabled=args.report is not None)
+
+    # cProfile only sees this process, the pitches are only in it when building with a single worker
+    python_profiler = None
+    if args.profile:
+        from cProfile import Profile
+        python_profiler = Profile()
+        python_profiler.enable()
+    try:
+        create_bank(args.input, workers, args.output, get_pitch_detector(detector), rate, channels, cache, args.attack_percent, args.sustain_percent, zone_step,
+                    get_shift_engine(shift_engine), profiler)
+    finally:
+        if python_profiler:
+            python_profiler.disable()
+            python_profiler.dump_stats(args.profile)
+
+    if args.report:
+        profiler.write(args.report, input=args.input, workers=workers, pitch_detector=detector, sample_rate=rate, channels=channels, build_cache=cache is not None,
+                       attack_percent=args.attack_percent, sustain_percent=args.sustain_percent, zone_step=zone_step, shift_engine=shift_engine)
+        print(f'Build report written: {args.report}')
+
+def render(args: Namespace) -> None:
+    # Rendering is done without the mixer, so the samples are only decoded as the notes need them
+    from .render import render_midi
+
+    read_banks(args.banks or get_default_bank_path())
+    bank = get_bank(args.bank)
+    single_loop = args.single_loop or get_configuration().getboolean('piano', 'single_loop', fallback=False)
+    voices = args.voices or get_configuration().getint('piano', 'voices', fallback=16)
+    stealer = get_voice_stealer(args.voice_stealing or get_configuration().get('piano', 'voice_stealing', fallback='oldest'))
+    frames = render_midi(args.input, bank, args.output, single_loop, voices, stealer=stealer)
+    print(f'Rendered {frames / SAMPLE_RATE:.1f} s of {args.input} with {bank.name} to {args.output}')
+
+def serve(args: Namespace) -> None:
+    from signal import SIGTERM, default_int_handler, pause, signal
+    from .shared import BankServer
+
+    server = BankServer(args.banks or get_default_bank_path(), args.shared or read_shared_bank_path())
+    # Stopping the server like any other service still takes its banks down
+    signal(SIGTERM, default_int_handler)
+    try:
+        for packed in server.publish():
+            print(f'Sharing bank: {packed}')
+        pause()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def pack(args: Namespace) -> None:
+    packed_bank = pack_bank(args.input, args.output)
+    print(f'Packed bank created: {packed_bank}')
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog='FartSampler', description='Plays sample banks from a midi keyboard and builds new banks from recordings')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build_parser = subparsers.add_parser('build', help='Create a sample bank archive from a recording')
+    build_parser.add_argument('input', type=Path, help='The recording to build the bank from')
+    build_parser.add_argument('--output', type=Path, default=None, help='Directory the bank archive is written to, defaults to the directory of the recording')
+    build_parser.add_argument('--workers', type=int, default=None, help='Number of processes used to build the pitches, 0 uses every core')
+    build_parser.add_argument('--pitch-detector', default=None, help='Algorithm used to find the pitch of the recording, yin or piptrack')
+    build_parser.add_argument('--attack-percent', type=float, default=.75, help='Fraction of the peak level where the attack of the recording ends')
+    build_parser.add_argument('--sustain-percent', type=float, default=.5, help='Fraction of the peak level the recording falls to where the sustain ends')
+    build_parser.add_argument('--shift-engine', default=None, help='How the recording is shifted to each pitch, quality, balanced or fast')
+    build_parser.add_argument('--zone-step', type=int, default=None, help='Build a sample every this many semitones and resample the pitches in between while playing')
+    build_parser.add_argument('--no-cache', action='store_true', help='Recompute every stage instead of reusing results from earlier builds')
+    build_parser.add_argument('--report', type=Path, default=None, help='Write the time, CPU, IO and peak memory of every build stage and pitch to this JSON file')
+    build_parser.add_argument('--profile', type=Path, default=None, help='Write cProfile stats of the build to this file, use --workers 1 to include the pitches')
+
+    pack_parser = subparsers.add_parser('pack', help='Convert a bank archive or bank directory into a single packed bank file')
+    pack_parser.add_argument('input', type=Path, help='The bank archive or installed bank directory to pack')
+    pack_parser.add_argument('--output', type=Path, default=None, help='Directory the packed bank is written to, defaults to the directory of the input')
+
+    render_parser = subparsers.add_parser('render', help='Play a midi file through a sample bank into a wav or flac file')
+    render_parser.add_argument('input', type=Path, help='The midi file to play')
+    render_parser.add_argument('output', type=Path, help='The audio file to write, the format is taken from its extension')
+    render_parser.add_argument('--bank', default=None, help='Name of the installed bank to play with, defaults to the first bank')
+    render_parser.add_argument('--banks', type=Path, default=None, help='Directory the banks are read from, defaults to the installed banks')
+    render_parser.add_argument('--single-loop', action='store_true', help='Play every sustain once instead of looping it while the key is held')
+    render_parser.add_argument('--voices', type=int, default=None, help='The most notes that sound at once, defaults to the piano configuration')
+    render_parser.add_argument('--voice-stealing', default=None, help='Which note gives way when every voice is in use, oldest, quietest, same-pitch or none')
+
+    replay_parser = subparsers.add_parser('replay', help='Play a recorded MIDI journal through the piano to reproduce or load test a session')
+    replay_parser.add_argument('journal', type=Path, help='The journal to play, recorded with the devices midi_journal setting')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='How many times faster than recorded to play, 0 plays as fast as possible')
+    replay_parser.add_argument('--tail', type=float, default=1.0, help='Seconds to keep playing after the last message so the last notes finish')
+
+    serve_parser = subparsers.add_parser('serve', help='Decode the banks once into shared memory for every piano on this host to use')
+    serve_parser.add_argument('--banks', type=Path, default=None, help='Directory the banks are read from, defaults to the installed banks')
+    serve_parser.add_argument('--shared', type=Path, default=None, help='Directory the banks are shared in, defaults to the piano shared_banks setting')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args)
+    elif args.command == 'pack':
+        pack(args)
+    elif args.command == 'render':
+        render(args)
+    elif args.command == 'replay':
+        replay(args)
+    elif args.command == 'serve':
+        serve(args)
+    else:
+        play(args)
@@ -0,0 +1,207 @@
+from numpy           import median as np_median, arange, argmax, bincount, clip, cumsum, full, int16, isnan, lexsort, log2 as np_log2, max as np_max, minimum, nan, ndarray, repeat, rint, where, zeros
+from numpy.random    import default_rng
+from librosa         import load as rosa_load
+from librosa.effects import pitch_shift
+from librosa.feature import rms as rms_calculation
+from pathlib         import Path
+from io              import BytesIO
+from typing          import Tuple
+from soundfile       import write as sf_write
+
+from .detect         import PitchDetector, YinDetector
+from .shift          import PitchShifter, VocoderShifter
+from .pitch          import Pitch
+from .sample         import Sample
+
+def _track_segments(y: ndarray, sr: int, segment_samples: int, detector: PitchDetector, hop_length: int = 512) -> Tuple[ndarray, ndarray]:
+    # One pitch track over the whole signal, every detected pitch is tagged with the segment its frame falls in
+    values, frames = detector.track(y, sr, hop_length)
+    segments = (frames * hop_length) // segment_samples
+    return values, segments
+
+def _segment_means(values: ndarray, segments: ndarray, n_segments: int) -> ndarray:
+    keep = segments < n_segments
+    counts = bincount(segments[keep], minlength=n_segments)
+    sums = bincount(segments[keep], weights=values[keep], minlength=n_segments)
+    means = full(n_segments, nan)
+    means[counts > 0] = sums[counts > 0] / counts[counts > 0]
+    return means
+
+def _segment_medians(values: ndarray, segments: ndarray, n_segments: int) -> ndarray:
+    keep = segments < n_segments
+    values = values[keep]
+    segments = segments[keep]
+
+    # Sort by segment then value so each segment's median sits in the middle of its run
+    ordered = values[lexsort((values, segments))]
+    counts = bincount(segments, minlength=n_segments)
+    starts = cumsum(counts) - counts
+    found = counts > 0
+    low = starts[found] + (counts[found] - 1) // 2
+    high = starts[found] + counts[found] // 2
+
+    medians = full(n_segments, nan)
+    medians[found] = (ordered[low] + ordered[high]) / 2
+    return medians
+
+def detect_dominant_pitch(y: ndarray, sr: int, segment_duration: float = .1, detector: PitchDetector = None) -> Pitch:
+    segment_samples = int(segment_duration * sr)
+    n_segments = max(0, -(-(len(y) - segment_samples) // segment_samples))
+    if n_segments == 0:
+        return None
+
+    values, segments = _track_segments(y, sr, segment_samples, detector or YinDetector())
+    pitches = _segment_means(values, segments, n_segments)
+    pitches = pitches[~isnan(pitches)]
+    
+    if len(pitches) > 0:
+        # Use median to find the most representative pitch
+        dominant_pitch = np_median(pitches)        
+        return Pitch.from_frequency(dominant_pitch)
+    else:
+        return None
+
+def analyze_dominant_pitch(file_path: Path, segment_duration: float = .1, detector: PitchDetector = None) -> Pitch:
+    try:
+        y, sr = rosa_load(file_path, sr=None)
+        return detect_dominant_pitch(y, sr, segment_duration, detector)
+    except Exception as e:
+        return None
+
+def _crossfade_window(low: int, high: int, start: int, end: int, overlap: int) -> ndarray:
+    # Ramps span the overlap on both sides of a join so neighbouring windows sum to one
+    positions = arange(low, high)
+    fade_in = clip((positions - (start - overlap)) / (2 * overlap), 0, 1)
+    fade_out = clip(((end + overlap) - positions) / (2 * overlap), 0, 1)
+    return minimum(fade_in, fade_out)
+
+def correct_audio(y: ndarray, sr: int, segment_duration: float = .1, overlap_duration: float = .01, detector: PitchDetector = None) -> Tuple[ndarray, Pitch]:
+    detector = detector or YinDetector()
+
+    # detect the dominant pitch of the sound
+    dominant_pitch = detect_dominant_pitch(y, sr, segment_duration * 4, detector)
+    if not dominant_pitch:
+        raise ValueError('Unable to detect a dominant pitch to correct to')
+    dominant_freq = dominant_pitch.frequency
+
+    # Find the pitch of every segment from a single pitch track
+    segment_samples = int(segment_duration * sr)
+    n_segments = -(-len(y) // segment_samples)
+    values, segments = _track_segments(y, sr, segment_samples, detector)
+    n_steps = np_log2(dominant_freq / _segment_medians(values, segments, n_segments)) * 12
+           
+    # Segments are shifted with a little context on each side and crossfaded into a preallocated buffer
+    overlap = max(1, int(overlap_duration * sr))
+    corrected_audio = zeros(len(y))
+    weights = zeros(len(y))
+    for segment in range(n_segments):
+        start = segment * segment_samples
+        end = min(start + segment_samples, len(y))
+        low = max(start - overlap, 0)
+        high = min(end + overlap, len(y))
+
+        segment_audio = y[low:high]
+        if not isnan(n_steps[segment]):
+            segment_audio = pitch_shift(y=segment_audio, sr=sr, n_steps=n_steps[segment])
+
+        window = _crossfade_window(low, high, start, end, overlap)
+        corrected_audio[low:high] += segment_audio * window
+        weights[low:high] += window
+
+    corrected_audio /= where(weights > 0, weights, 1)
+    return (corrected_audio, dominant_pitch)
+        
+def correct_pitch(file_path: Path, segment_duration: float = .1, detector: PitchDetector = None) -> Tuple[Path, Pitch]:
+
+    # Load the audio
+    y, sr = rosa_load(file_path, sr=None)
+
+    corrected_audio, dominant_pitch = correct_audio(y, sr, segment_duration, detector=detector)
+    
+    # Save the corrected audio to a new file
+    corrected_file_path = file_path.with_name(file_path.stem + f'_{dominant_pitch}.wav')
+    sf_write(corrected_file_path, corrected_audio, sr)  # Use soundfile to write the audio
+    
+    return (corrected_file_path, dominant_pitch)
+
+def shift_pitch(y: ndarray, sr: int, source: Pitch, dest: Pitch, shifter: PitchShifter = None) -> ndarray:
+    # Apply pitch shift transformation
+    return (shifter or VocoderShifter()).shift(y, sr, source, dest)
+
+def pitch_shift_sample(file_path: Path, source: Pitch, dest: Pitch, shifter: PitchShifter = None) -> Tuple[Path, Pitch]:
+
+    # Load the audio from file
+    y, sr = rosa_load(file_path, sr=None)
+
+    shifted_audio = shift_pitch(y, sr, source, dest, shifter)
+
+    sample_name = file_path.stem
+    sample_name = sample_name.replace(str(source), str(dest))
+    
+    # Create the new file name based on the destination pitch
+    shifted_file_path = file_path.with_stem(sample_name)
+
+    # Save the pitch-shifted audio
+    sf_write(shifted_file_path, shifted_audio, sr)
+
+    return shifted_file_path, dest
+
+def find_boundries(y: ndarray, frame_length=2048, hop_length=512, attack_percent=.75, sustain_percent=0.5) -> Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]:
+    # Calculate the intensity of the samples
+    rms = rms_calculation(y=y, frame_length=frame_length, hop_length=hop_length).flatten()
+
+    max_rms = np_max(rms)
+    attack_threshold = attack_percent * max_rms
+    sustain_threshold = sustain_percent * max_rms
+
+    attack_start = 0
+    attack_end = int(argmax(rms > attack_threshold))
+    sustain_start = attack_end + 1
+    sustain_end = int(sustain_start + argmax(rms[sustain_start:] < sustain_threshold))
+    decay_start = sustain_end + 1
+    decay_end = int(decay_start + argmax(rms[decay_start:] == 0))
+
+    ret = ((attack_start, attack_end * hop_length), (attack_end * hop_length, sustain_end * hop_length ), (sustain_end * hop_length, decay_end * hop_length))
+    return ret
+
+def define_boundries(file_path: Path, frame_length=2048, hop_length=512, attack_percent=.75, sustain_percent=0.5) -> Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]:
+    # Load the samples
+    y, sr = rosa_load(file_path, sr=None)
+    return find_boundries(y, frame_length, hop_length, attack_percent, sustain_percent)
+
+def split_sample(y: ndarray, boundries: Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]) -> Tuple[ndarray, ndarray, ndarray]:
+    # Grab the sample buffers
+    attack_segment = y[boundries[0][0]:boundries[0][1]]
+    sustain_segment = y[boundries[1][0]:boundries[1][1]]
+    decay_segment = y[boundries[2][0]:boundries[2][1]]
+    return (attack_segment, sustain_segment, decay_segment)
+
+def quantize(y: ndarray, channels: int = 1, seed: int = 0) -> ndarray:
+    # One bit of triangular dither before rounding keeps quiet tails from turning into distortion,
+    # the seed keeps the noise the same from build to build
+    rng = default_rng(seed)
+    dither = rng.random(len(y)) - rng.random(len(y))
+    pcm = clip(rint(y * 32767 + dither), -32768, 32767).astype(int16)
+    return repeat(pcm[:, None], channels, axis=1)
+
+def encode_segment(y: ndarray, sr: int, channels: int = 1, seed: int = 0) -> bytes:
+    buffer = BytesIO()
+    sf_write(buffer, quantize(y, channels, seed), sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+def create_sample(file_path: Path, pitch: Pitch, boundries: Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]) -> Sample:
+    
+    y, sr = rosa_load(file_path, sr=None)
+    
+    attack_segment, sustain_segment, decay_segment = split_sample(y, boundries)
+
+    attack_file = file_path.with_name(file_path.stem + '_attack.wav')
+    sustain_file = file_path.with_name(file_path.stem + '_sustain.wav')
+    decay_file = file_path.with_name(file_path.stem + '_decay.wav')
+
+    sf_write(attack_file, attack_segment, sr)
+    sf_write(sustain_file, sustain_segment, sr)
+    sf_write(decay_file, decay_segment, sr)
+
+    sample = Sample(attack_file, sustain_file, decay_file, pitch)
+    return sample
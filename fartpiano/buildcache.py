@@ -0,0 +1,90 @@
+from hashlib  import sha256
+from os       import getpid, replace, utime
+from pathlib  import Path
+from typing   import Any, Dict, Optional
+from numpy    import ndarray, load as np_load, savez
+
+import numpy
+import scipy
+import soundfile
+import librosa
+
+# Bump when the analysis or shifting code changes what it produces for the same inputs
+_CACHE_VERSION = 1
+_VERSIONS = f'{_CACHE_VERSION} librosa {librosa.__version__} numpy {numpy.__version__} scipy {scipy.__version__} soundfile {soundfile.__version__}'
+
+class BuildCache(object):
+    '''Keeps the results of expensive build stages on disk, keyed by a hash of everything that went into them.'''
+
+    def __init__(self, root: Path, budget: Optional[int] = None) -> None:
+        # budget is in bytes, None means unbounded
+        self._root = root
+        self._budget = budget
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    @property
+    def budget(self) -> Optional[int]:
+        return self._budget
+
+    @property
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def key(self, *parts: Any) -> str:
+        digest = sha256(_VERSIONS.encode())
+        for part in parts:
+            if isinstance(part, ndarray):
+                digest.update(f'{part.dtype}{part.shape}'.encode())
+                digest.update(part.tobytes())
+            else:
+                digest.update(repr(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, ndarray]]:
+        path = self._path(key)
+        try:
+            with np_load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError):
+            return None
+        # Reading an entry counts as using it, so it's the last to be evicted
+        utime(path)
+        return arrays
+
+    def store(self, key: str, **arrays: ndarray) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Workers can finish the same entry at once, write aside and move it in whole
+        temp = path.with_name(f'{path.stem}.{getpid()}.tmp')
+        with open(temp, 'wb') as entry:
+            savez(entry, **arrays)
+        replace(temp, path)
+
+    def trim(self) -> int:
+        if self._budget is None:
+            return 0
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        removed = 0
+        for entry in entries:
+            if size <= self._budget:
+                break
+            entry_size = entry.stat().st_size
+            entry.unlink(missing_ok=True)
+            size -= entry_size
+            removed += entry_size
+        return removed
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            entry.unlink(missing_ok=True)
+
+    def _entries(self):
+        return self._root.glob('*/*.npz') if self._root.exists() else iter(())
+
+    def _path(self, key: str) -> Path:
+        return self._root/key[:2]/f'{key}.npz'
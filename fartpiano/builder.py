@@ -0,0 +1,173 @@
+from pathlib                       import Path
+from typing                        import Any, Dict, Iterator, List, Optional, Tuple
+from json                          import dumps
+from zipfile                       import ZipFile, ZipInfo
+from concurrent.futures            import ProcessPoolExecutor
+from contextlib                    import contextmanager, nullcontext
+from multiprocessing.shared_memory import SharedMemory
+from os                            import cpu_count
+from numpy                         import ndarray, array
+from librosa                       import load as rosa_load
+
+from .analysis   import find_boundries, split_sample, encode_segment, correct_audio, shift_pitch
+from .sample     import Sample, Bank, SAMPLE_FORMAT
+from .pitch      import Pitch
+from .detect     import PitchDetector, YinDetector
+from .engine     import SAMPLE_RATE, CHANNELS
+from .buildcache import BuildCache
+from .shift      import PitchShifter, VocoderShifter
+from .profiling  import BuildProfiler
+
+class _SharedAudio(object):
+
+    def __init__(self, y: ndarray, sr: int) -> None:
+        self._memory = SharedMemory(create=True, size=max(y.nbytes, 1))
+        self._name = self._memory.name
+        self._shape = y.shape
+        self._dtype = y.dtype
+        self._sr = sr
+        ndarray(self._shape, dtype=self._dtype, buffer=self._memory.buf)[:] = y
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Workers only need enough to attach to the block by name
+        return {'_name': self._name, '_shape': self._shape, '_dtype': self._dtype, '_sr': self._sr, '_memory': None}
+
+    @property
+    def sr(self) -> int:
+        return self._sr
+
+    @contextmanager
+    def attach(self) -> Iterator[ndarray]:
+        memory = SharedMemory(name=self._name) if self._memory is None else self._memory
+        try:
+            y = ndarray(self._shape, dtype=self._dtype, buffer=memory.buf)
+            yield y
+            del y
+        finally:
+            if memory is not self._memory:
+                memory.close()
+
+    def release(self) -> None:
+        self._memory.close()
+        self._memory.unlink()
+
+def _create_pitch_segments(audio: _SharedAudio, source: Pitch, dest: Pitch, boundries: Tuple, channels: int,
+                           cache: Optional[BuildCache], key: Optional[str], shifter: PitchShifter,
+                           profile: bool = False) -> Tuple[Tuple[bytes, bytes, bytes], List[Dict[str, Any]]]:
+    # Workers time their own stages and hand the records back with the segments
+    profiler = BuildProfiler(profile)
+    with profiler.stage('pitch', pitch=dest):
+        segments = _shift_and_encode(audio, source, dest, boundries, channels, cache, key, shifter, profiler)
+    return segments, profiler.records
+
+def _shift_and_encode(audio: _SharedAudio, source: Pitch, dest: Pitch, boundries: Tuple, channels: int,
+                      cache: Optional[BuildCache], key: Optional[str], shifter: PitchShifter, profiler: BuildProfiler) -> Tuple[bytes, bytes, bytes]:
+    with audio.attach() as y:
+        if dest == source:
+            with profiler.stage('encode', pitch=dest):
+                segments = split_sample(y, boundries)
+                return tuple(encode_segment(segment, audio.sr, channels, dest.midi * 3 + index) for index, segment in enumerate(segments))
+
+        # The whole shifted recording is cached so new boundries can be cut from it without shifting again
+        with profiler.stage('shift', pitch=dest) as details:
+            cached = cache.load(key) if cache else None
+            details['cached'] = bool(cached)
+            if cached:
+                shifted_audio = cached['audio']
+            else:
+                shifted_audio = shift_pitch(y, audio.sr, source, dest, shifter)
+                if cache:
+                    cache.store(key, audio=shifted_audio)
+        length = len(y)
+
+    # Shifters that change the speed stretch the boundries along with the audio
+    if len(shifted_audio) != length:
+        scale = len(shifted_audio) / length
+        boundries = tuple((int(start * scale), int(end * scale)) for start, end in boundries)
+    with profiler.stage('encode', pitch=dest):
+        segments = split_sample(shifted_audio, boundries)
+        return tuple(encode_segment(segment, audio.sr, channels, dest.midi * 3 + index) for index, segment in enumerate(segments))
+
+def _zip_write(zip_file: ZipFile, name: str, data: bytes) -> None:
+    # Fixed timestamps and attributes so the same bank always zips to the same bytes
+    info = ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.external_attr = 0o644 << 16
+    zip_file.writestr(info, data)
+
+def _correct(y: ndarray, sr: int, detector: PitchDetector, cache: Optional[BuildCache], profiler: BuildProfiler) -> Tuple[ndarray, Pitch, Optional[str]]:
+    detector = detector or YinDetector()
+    with profiler.stage('correct') as details:
+        key = cache.key('correct', y, sr, type(detector).__name__, sorted(vars(detector).items())) if cache else None
+        cached = cache.load(key) if cache else None
+        details['cached'] = bool(cached)
+        if cached:
+            return cached['audio'], Pitch.from_midi(int(cached['pitch'])), key
+
+        corrected_audio, corrected_pitch = correct_audio(y, sr, detector=detector)
+        if cache:
+            cache.store(key, audio=corrected_audio, pitch=array(corrected_pitch.midi))
+        return corrected_audio, corrected_pitch, key
+
+def create_bank(input_file: Path, workers: int = 0, output_dir: Path = None, detector: PitchDetector = None, rate: int = SAMPLE_RATE, channels: int = CHANNELS,
+                cache: Optional[BuildCache] = None, attack_percent: float = .75, sustain_percent: float = .5, zone_step: int = 1,
+                shifter: PitchShifter = None, profiler: Optional[BuildProfiler] = None) -> Path:
+    shifter = shifter or VocoderShifter()
+    profiler = profiler or BuildProfiler(enabled=False)
+
+    with profiler.stage('build'):
+        # Everything stays in memory from here until the segments land in the archive.
+        # The recording is resampled to the mixer rate up front so the piano never has to.
+        with profiler.stage('load'):
+            y, sr = rosa_load(input_file, sr=rate)
+
+        # define the boundries from the input file
+        with profiler.stage('boundries'):
+            boundries = find_boundries(y, attack_percent=attack_percent, sustain_percent=sustain_percent)
+
+        bank = Bank(input_file.stem, sr, channels, SAMPLE_FORMAT)
+
+        # Pitch correct the input, reusing an earlier correction of the same audio when there is one
+        corrected_audio, corrected_pitch, corrected_key = _correct(y, sr, detector, cache, profiler)
+
+        # Create a version for every zone_step pitches counting from the corrected pitch, which goes first to keep the bank order stable
+        pitches = [corrected_pitch] + [pitch for pitch in Pitch.iterate() if pitch != corrected_pitch and (pitch.midi - corrected_pitch.midi) % zone_step == 0]
+        for pitch in pitches:
+            stem = f'{bank.name}_{pitch}'
+            bank.add_sample(pitch, Sample(Path(f'{stem}_attack.wav'), Path(f'{stem}_sustain.wav'), Path(f'{stem}_decay.wav'), pitch))
+
+        # The pitches in between are played by resampling the closest sample
+        if zone_step > 1:
+            stored = sorted(pitches)
+            for pitch in Pitch.iterate():
+                closest = min(stored, key=lambda sample_pitch: abs(sample_pitch.midi - pitch.midi))
+                bank.add_zone(closest, pitch, pitch)
+
+        # Zip up the bank for importing, samples are written as the workers hand them back
+        output_dir = output_dir or input_file.parent
+        bank_zip = output_dir/f'{bank.name}.zip'
+        audio = _SharedAudio(corrected_audio, sr)
+        try:
+            with ZipFile(bank_zip, 'w') as zip_file:
+                _zip_write(zip_file, f'{bank.name}.json', dumps(bank.to_dict(), indent=4).encode())
+
+                shifter_key = (type(shifter).__name__, sorted(vars(shifter).items()))
+                keys = [cache.key('shift', corrected_key, corrected_pitch.midi, pitch.midi, shifter_key) if cache else None for pitch in pitches]
+                tasks = ([audio] * len(pitches), [corrected_pitch] * len(pitches), pitches, [boundries] * len(pitches), [channels] * len(pitches),
+                         [cache] * len(pitches), keys, [shifter] * len(pitches), [profiler.enabled] * len(pitches))
+                workers = workers or cpu_count() or 1
+                with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+                    results = executor.map(_create_pitch_segments, *tasks) if executor else map(_create_pitch_segments, *tasks)
+                    for pitch, (segments, records) in zip(pitches, results):
+                        profiler.extend(records)
+                        sample = bank.samples[pitch]
+                        with profiler.stage('archive', pitch=pitch):
+                            for name, data in zip((sample.attack.name, sample.sustain.name, sample.decay.name), segments):
+                                _zip_write(zip_file, name, data)
+        finally:
+            audio.release()
+            if cache:
+                with profiler.stage('trim cache'):
+                    cache.trim()
+
+    print(f'Sample bank created: {bank_zip}')
+    return bank_zip
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from pathlib     import Path
+from threading   import Lock
+from typing      import Dict, Iterable, List, Optional, Tuple
+from numpy       import ndarray, arange, array, interp, pad, repeat, int16, int32
+from soundfile   import read as sf_read
+
+from .sample import Sample
+from .pitch  import Pitch
+from .engine import SAMPLE_RATE, CHANNELS, LEVEL_WINDOW
+
+def decode(file_path: Path, rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> ndarray:
+    y, sr = sf_read(file_path, dtype='int16', always_2d=True)
+    return convert(y, sr, rate, channels)
+
+def convert(y: ndarray, sr: int, rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> ndarray:
+    # Match the channel layout of the mixer
+    if y.shape[1] != channels:
+        if channels == 1:
+            y = y.mean(axis=1, keepdims=True).astype(int16)
+        else:
+            y = repeat(y[:, :1], channels, axis=1)
+
+    # Banks are expected to be built at the mixer rate, fall back to a linear resample
+    if sr != rate and len(y) > 0:
+        length = int(round(len(y) * rate / sr))
+        positions = arange(length) * (sr / rate)
+        source = arange(len(y))
+        y = array([interp(positions, source, y[:, channel]) for channel in range(y.shape[1])]).T.astype(int16)
+
+    return y
+
+def repitch(y: ndarray, semitones: int) -> ndarray:
+    # Plays the audio faster or slower by linear interpolation, the length changes with the pitch
+    if semitones == 0 or len(y) == 0:
+        return y
+    ratio = 2 ** (semitones / 12)
+    positions = arange(int(len(y) / ratio)) * ratio
+    source = arange(len(y))
+    return array([interp(positions, source, y[:, channel]) for channel in range(y.shape[1])]).T.astype(int16).reshape(-1, y.shape[1])
+
+def _levels(y: ndarray) -> List[float]:
+    windows = -(-len(y) // LEVEL_WINDOW)
+    padded = pad(y.reshape(len(y), -1), ((0, windows * LEVEL_WINDOW - len(y)), (0, 0)))
+    padded = padded.reshape(windows, -1).astype(int32)
+    return (padded.max(axis=1) - padded.min(axis=1)).astype(float).tolist()
+
+class SampleSounds(object):
+
+    def __init__(self, pitch: Pitch, attack: ndarray, sustain: ndarray, decay: ndarray) -> None:
+        self._pitch = pitch
+        self._attack = attack
+        self._sustain = sustain
+        self._decay = decay
+        self._nbytes = attack.nbytes + sustain.nbytes + decay.nbytes
+        self._levels: Optional[Tuple[List[float], List[float], List[float]]] = None
+
+    def __str__(self) -> str:
+        return f'Sounds {self._pitch}: {self._nbytes} bytes'
+
+    @property
+    def pitch(self) -> Pitch:
+        return self._pitch
+
+    @property
+    def attack(self) -> ndarray:
+        return self._attack
+
+    @property
+    def sustain(self) -> ndarray:
+        return self._sustain
+
+    @property
+    def decay(self) -> ndarray:
+        return self._decay
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @property
+    def levels(self) -> Tuple[List[float], List[float], List[float]]:
+        # Peak to peak of every LEVEL_WINDOW frames of each segment, only worked out once a voice has to be stolen
+        if self._levels is None:
+            self._levels = tuple(_levels(segment) for segment in (self._attack, self._sustain, self._decay))
+        return self._levels
+
+    @classmethod
+    def decode(cls, sample: Sample, rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> 'SampleSounds':
+        steps = sample.pitch.midi - sample.source.midi
+        segments = (repitch(decode(segment, rate, channels), steps) for segment in (sample.attack, sample.sustain, sample.decay))
+        return SampleSounds(sample.pitch, *segments)
+
+    def repitched(self, pitch: Pitch) -> 'SampleSounds':
+        steps = pitch.midi - self._pitch.midi
+        return SampleSounds(pitch, repitch(self._attack, steps), repitch(self._sustain, steps), repitch(self._decay, steps))
+
+class SoundCache(object):
+
+    def __init__(self, budget: Optional[int] = None) -> None:
+        # budget is in bytes, None means unbounded and 0 disables caching
+        self._budget = budget
+        self._sounds: OrderedDict[Pitch, SampleSounds] = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._prefetched = 0
+
+    def __len__(self) -> int:
+        return len(self._sounds)
+
+    def __contains__(self, pitch: Pitch) -> bool:
+        return pitch in self._sounds
+
+    @property
+    def budget(self) -> Optional[int]:
+        return self._budget
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions, 'prefetched': self._prefetched}
+
+    def get(self, sample: Sample) -> SampleSounds:
+        with self._lock:
+            sounds = self._sounds.get(sample.pitch)
+            if sounds:
+                self._sounds.move_to_end(sample.pitch)
+                self._hits += 1
+                return sounds
+            self._misses += 1
+
+        # Decode outside of the lock so lookups for other keys are not held up
+        sounds = SampleSounds.decode(sample)
+        self._insert(sounds)
+        return sounds
+
+    def prefetch(self, sample: Sample) -> None:
+        # Unlike get this leaves the recency of a cached sample alone and isn't counted as a lookup
+        if sample.pitch in self._sounds:
+            return
+        if self._insert(SampleSounds.decode(sample)):
+            self._prefetched += 1
+
+    def preload(self, samples: Iterable[Sample]) -> None:
+        for sample in samples:
+            if self._budget is not None and self._size >= self._budget:
+                break
+            self.get(sample)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sounds.clear()
+            self._size = 0
+
+    def _insert(self, sounds: SampleSounds) -> bool:
+        if self._budget is not None and sounds.nbytes > self._budget:
+            return False
+        with self._lock:
+            if sounds.pitch in self._sounds:
+                return False
+            self._sounds[sounds.pitch] = sounds
+            self._size += sounds.nbytes
+            while self._budget is not None and self._size > self._budget:
+                _, evicted = self._sounds.popitem(last=False)
+                self._size -= evicted.nbytes
+                self._evictions += 1
+        return True
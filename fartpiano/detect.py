@@ -0,0 +1,87 @@
+from abc                     import ABC, abstractmethod
+from typing                  import Dict, Tuple, Type
+from numpy                   import arange, argmax, cumsum, errstate, flatnonzero, float32, isfinite, ndarray, nonzero, ones, pad, take_along_axis, where, zeros
+from scipy.fft               import irfft, rfft
+from numpy.lib.stride_tricks import sliding_window_view
+from librosa                 import piptrack
+
+class PitchDetector(ABC):
+
+    @abstractmethod
+    def track(self, y: ndarray, sr: int, hop_length: int = 512) -> Tuple[ndarray, ndarray]:
+        '''Returns the detected frequencies and the index of the frame each one was found in.'''
+        raise NotImplementedError(f'{type(self).__name__} does not implement track')
+
+class PiptrackDetector(PitchDetector):
+
+    def track(self, y: ndarray, sr: int, hop_length: int = 512) -> Tuple[ndarray, ndarray]:
+        # piptrack reports a candidate for every peak bin, so a frame can hold many values
+        pitches, _ = piptrack(y=y, sr=sr, hop_length=hop_length)
+        _, frames = nonzero(pitches > 0)
+        return pitches[pitches > 0], frames
+
+class YinDetector(PitchDetector):
+
+    def __init__(self, fmin: float = 65.0, fmax: float = 4500.0, frame_length: int = 2048, threshold: float = .15) -> None:
+        self._fmin = fmin
+        self._fmax = fmax
+        self._frame_length = frame_length
+        self._threshold = threshold
+
+    def track(self, y: ndarray, sr: int, hop_length: int = 512) -> Tuple[ndarray, ndarray]:
+        tau_min = max(2, int(sr / self._fmax))
+        tau_max = min(int(sr / self._fmin), self._frame_length // 2)
+        window = self._frame_length - tau_max
+
+        # Frames are centred on multiples of the hop like piptrack's so both detectors line up with segments
+        padded = pad(y, self._frame_length // 2)
+        frames = sliding_window_view(padded, self._frame_length)[::hop_length].astype(float32)
+
+        # Difference function for every frame at once, the cross term comes from one FFT correlation.
+        # Lags past tau_max wrap around in a frame sized FFT but those are never read.
+        size = self._frame_length
+        correlation = irfft(rfft(frames[:, :window], size).conj() * rfft(frames, size), size)[:, :tau_max + 1]
+        energy = (frames[:, :window] ** 2).sum(axis=1)
+        shifted_energy = zeros((len(frames), tau_max + 1), dtype=float32)
+        shifted_energy[:, 0] = energy
+        shifted_energy[:, 1:] = energy[:, None] + cumsum(frames[:, window:] ** 2 - frames[:, :tau_max] ** 2, axis=1)
+        difference = energy[:, None] + shifted_energy - 2 * correlation
+        difference[:, 0] = 0
+
+        # Cumulative mean normalised difference
+        with errstate(divide='ignore', invalid='ignore'):
+            normalised = difference * arange(tau_max + 1) / cumsum(difference, axis=1)
+        normalised[:, 0] = 1
+        normalised[:, :tau_min] = 1
+
+        # First dip under the threshold, then walk down to the bottom of that dip
+        below = normalised < self._threshold
+        voiced = below.any(axis=1) & (energy > 1e-10)
+        first = argmax(below, axis=1)
+        rising = ones(normalised.shape, dtype=bool)
+        rising[:, :-1] = normalised[:, 1:] >= normalised[:, :-1]
+        rising &= arange(tau_max + 1) >= first[:, None]
+        tau = argmax(rising, axis=1)
+
+        # Parabolic interpolation around the minimum for sub-sample periods
+        tau = tau.clip(1, tau_max - 1)
+        before = take_along_axis(normalised, (tau - 1)[:, None], axis=1)[:, 0]
+        at = take_along_axis(normalised, tau[:, None], axis=1)[:, 0]
+        after = take_along_axis(normalised, (tau + 1)[:, None], axis=1)[:, 0]
+        with errstate(divide='ignore', invalid='ignore'):
+            curve = before - 2 * at + after
+            offset = where(curve > 0, (before - after) / (2 * curve), 0)
+            frequencies = sr / (tau + offset)
+
+        found = flatnonzero(voiced & isfinite(frequencies))
+        return frequencies[found], found
+
+PITCH_DETECTORS: Dict[str, Type[PitchDetector]] = {
+    'yin': YinDetector,
+    'piptrack': PiptrackDetector,
+}
+
+def get_pitch_detector(name: str = 'yin') -> PitchDetector:
+    if name not in PITCH_DETECTORS:
+        raise ValueError(f'Unknown pitch detector {name}, expected one of {", ".join(PITCH_DETECTORS)}')
+    return PITCH_DETECTORS[name]()
@@ -0,0 +1,283 @@
+from abc         import ABC, abstractmethod
+from collections import deque
+from enum        import Enum
+from threading   import Event
+from typing      import Any, Deque, Dict, List, Optional, Tuple, Type
+from numpy       import ndarray, zeros, clip, int16, int32
+
+from .pitch import Pitch
+
+# The format every sample is decoded to and the mixer is opened with
+SAMPLE_RATE = 44100
+CHANNELS    = 1
+BLOCK_SIZE  = 512
+
+# Frames in each step of the level envelope the voice stealing measures sounds by
+LEVEL_WINDOW = 256
+
+class VoicePhase(Enum):
+    IDLE    = 0
+    ATTACK  = 1
+    SUSTAIN = 2
+    DECAY   = 3
+
+class _Command(Enum):
+    ATTACK  = 0
+    RELEASE     = 1
+    RELEASE_ALL = 2
+
+class Voice(object):
+
+    def __init__(self) -> None:
+        self._phase = VoicePhase.IDLE
+        self._pitch: Optional[Pitch] = None
+        self._sounds: Any = None
+        self._segments: Tuple[ndarray, ndarray, ndarray] = None
+        self._single_loop = False
+        self._released = False
+        self._position = 0
+        self._order = 0
+
+    def __str__(self) -> str:
+        return f'Voice {self._pitch}: {self._phase.name}'
+
+    @property
+    def phase(self) -> VoicePhase:
+        return self._phase
+
+    @property
+    def pitch(self) -> Optional[Pitch]:
+        return self._pitch
+
+    @property
+    def active(self) -> bool:
+        return self._phase != VoicePhase.IDLE
+
+    @property
+    def held(self) -> bool:
+        return self.active and not self._released
+
+    @property
+    def order(self) -> int:
+        return self._order
+
+    @property
+    def level(self) -> float:
+        # How loud the voice is right now, decays fade out so released voices are usually the quietest
+        if self._phase == VoicePhase.IDLE:
+            return 0.0
+        levels = self._sounds.levels[self._phase.value - 1]
+        index = self._position // LEVEL_WINDOW
+        return levels[index] if index < len(levels) else 0.0
+
+    def start(self, pitch: Pitch, sounds: Any, single_loop: bool, order: int) -> None:
+        self._pitch = pitch
+        self._sounds = sounds
+        self._segments = (sounds.attack, sounds.sustain, sounds.decay)
+        self._single_loop = single_loop
+        self._released = False
+        self._position = 0
+        self._order = order
+        self._phase = VoicePhase.ATTACK
+
+    def release(self) -> None:
+        self._released = True
+        # A looping sustain is cut off as soon as the key is let go
+        if self._phase == VoicePhase.SUSTAIN and not self._single_loop:
+            self._enter(VoicePhase.DECAY)
+
+    def stop(self) -> None:
+        self._phase = VoicePhase.IDLE
+        self._sounds = None
+        self._segments = None
+        self._pitch = None
+
+    def render(self, out: ndarray) -> None:
+        frames = len(out)
+        written = 0
+        while written < frames and self._phase != VoicePhase.IDLE:
+            segment = self._segments[self._phase.value - 1]
+            count = min(len(segment) - self._position, frames - written)
+            if count > 0:
+                out[written:written + count] += segment[self._position:self._position + count]
+                written += count
+                self._position += count
+            if self._position >= len(segment):
+                if self._phase == VoicePhase.SUSTAIN and not self._single_loop and not self._released:
+                    if len(segment) == 0:
+                        break
+                    self._position = 0
+                else:
+                    self._advance()
+
+    def _advance(self) -> None:
+        if self._phase == VoicePhase.ATTACK:
+            if self._released and not self._single_loop:
+                self._enter(VoicePhase.DECAY)
+            else:
+                self._enter(VoicePhase.SUSTAIN)
+        elif self._phase == VoicePhase.SUSTAIN:
+            self._enter(VoicePhase.DECAY)
+        else:
+            self.stop()
+
+    def _enter(self, phase: VoicePhase) -> None:
+        self._phase = phase
+        self._position = 0
+
+class VoiceStealer(ABC):
+
+    @abstractmethod
+    def choose(self, voices: List[Voice], pitch: Pitch) -> Optional[Voice]:
+        '''Picks the sounding voice that gives way to a new note at pitch, None drops the new note instead.'''
+        raise NotImplementedError(f'{type(self).__name__} does not implement choose')
+
+class OldestStealer(VoiceStealer):
+
+    def choose(self, voices: List[Voice], pitch: Pitch) -> Optional[Voice]:
+        return min(voices, key=lambda voice: voice.order)
+
+class QuietestStealer(VoiceStealer):
+
+    def choose(self, voices: List[Voice], pitch: Pitch) -> Optional[Voice]:
+        return min(voices, key=lambda voice: (voice.level, voice.order))
+
+class SamePitchStealer(VoiceStealer):
+
+    def choose(self, voices: List[Voice], pitch: Pitch) -> Optional[Voice]:
+        # A key played again while its last note still decays takes that voice back, otherwise the oldest goes
+        for voice in voices:
+            if voice.pitch == pitch:
+                return voice
+        return min(voices, key=lambda voice: voice.order)
+
+class NoStealer(VoiceStealer):
+
+    def choose(self, voices: List[Voice], pitch: Pitch) -> Optional[Voice]:
+        return None
+
+VOICE_STEALERS: Dict[str, Type[VoiceStealer]] = {
+    'oldest': OldestStealer,
+    'quietest': QuietestStealer,
+    'same-pitch': SamePitchStealer,
+    'none': NoStealer,
+}
+
+def get_voice_stealer(name: str = 'oldest') -> VoiceStealer:
+    if name not in VOICE_STEALERS:
+        raise ValueError(f'Unknown voice stealing policy {name}, expected one of {", ".join(VOICE_STEALERS)}')
+    return VOICE_STEALERS[name]()
+
+class VoiceEngine(object):
+
+    def __init__(self, voices: int = 16, channels: int = CHANNELS, block_size: int = BLOCK_SIZE,
+                 stealer: Optional[VoiceStealer] = None) -> None:
+        self._voices = [Voice() for _ in range(voices)]
+        self._stealer = stealer or OldestStealer()
+        self._stolen = 0
+        self._dropped = 0
+        self._active: List[Voice] = []
+        self._channels = channels
+        self._block_size = block_size
+        self._mix = zeros((block_size, channels), dtype=int32)
+
+        # Commands are queued from the input side and only ever consumed by the
+        # render loop, deque append/popleft are atomic so no lock is needed
+        self._commands: Deque[Tuple] = deque()
+        self._order = 0
+        self._wake = Event()
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size
+
+    @property
+    def voices(self) -> int:
+        return len(self._voices)
+
+    @property
+    def active_voices(self) -> int:
+        return len(self._active)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'stolen': self._stolen, 'dropped': self._dropped}
+
+    @property
+    def idle(self) -> bool:
+        return not self._active and not self._commands
+
+    def attack(self, pitch: Pitch, sounds: Any, single_loop: bool) -> None:
+        self._commands.append((_Command.ATTACK, pitch, sounds, single_loop))
+        self._wake.set()
+
+    def release(self, pitch: Pitch) -> None:
+        self._commands.append((_Command.RELEASE, pitch))
+        self._wake.set()
+
+    def stop_all(self) -> None:
+        # Lets go of every key, the notes still decay so nothing is cut off with a click
+        self._commands.append((_Command.RELEASE_ALL,))
+        self._wake.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        woke = self._wake.wait(timeout)
+        self._wake.clear()
+        return woke
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def render(self, frames: Optional[int] = None) -> ndarray:
+        self._process_commands()
+
+        mix = self._mix if frames is None else zeros((frames, self._channels), dtype=int32)
+        mix.fill(0)
+        for voice in self._active:
+            voice.render(mix)
+        self._active = [voice for voice in self._active if voice.active]
+
+        return clip(mix, -32768, 32767).astype(int16)
+
+    def _process_commands(self) -> None:
+        while self._commands:
+            command = self._commands.popleft()
+            if command[0] == _Command.ATTACK:
+                self._start_voice(*command[1:])
+            elif command[0] == _Command.RELEASE:
+                for voice in self._active:
+                    if voice.held and voice.pitch == command[1]:
+                        voice.release()
+            else:
+                for voice in self._active:
+                    if voice.held:
+                        voice.release()
+
+    def _start_voice(self, pitch: Pitch, sounds: Any, single_loop: bool) -> None:
+        for voice in self._active:
+            if voice.held and voice.pitch == pitch:
+                return
+
+        voice = self._allocate(pitch)
+        if voice is None:
+            return
+        self._order += 1
+        voice.start(pitch, sounds, single_loop, self._order)
+        if voice not in self._active:
+            self._active.append(voice)
+
+    def _allocate(self, pitch: Pitch) -> Optional[Voice]:
+        for voice in self._voices:
+            if not voice.active:
+                return voice
+        # Out of voices, the stealer decides which one is cut off or if the new note is dropped
+        voice = self._stealer.choose(self._active, pitch) if self._active else None
+        if voice is None:
+            self._dropped += 1
+        else:
+            self._stolen += 1
+        return voice
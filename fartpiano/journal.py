@@ -0,0 +1,193 @@
+from datetime   import datetime
+from os         import getpid
+from pathlib    import Path
+from struct     import Struct
+from threading  import Thread, Event, Lock
+from time       import perf_counter, perf_counter_ns, sleep, time
+from typing     import BinaryIO, Callable, Dict, List, Optional, Tuple
+from mido       import Message
+from mido.ports import BaseInput
+
+JOURNAL_MAGIC = b'FPJ1'
+# Magic, version and the wall clock time the recording started, for reference
+JOURNAL_HEADER = Struct('<4sHxxd')
+# Nanoseconds since the recording started, port, kind, message size and the message itself
+JOURNAL_RECORD = Struct('<qHBB4s')
+
+RECORD_MESSAGE = 0
+# Names the port index of the record, the name follows in size records of its own
+RECORD_PORT    = 1
+
+# Seconds a journal may hold messages in memory before they are written out
+JOURNAL_FLUSH_INTERVAL = 1.0
+JOURNAL_SUFFIX = '.fpj'
+
+class JournalWriter(object):
+    '''Appends every MIDI message to a journal of fixed size records, cheap enough to keep on while playing.
+
+    Messages longer than four bytes, like system exclusive ones, aren't recorded. They are written out every
+    JOURNAL_FLUSH_INTERVAL seconds, so the last of them reach the file even when the keyboards go quiet.
+    '''
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._file: BinaryIO = open(path, 'xb')
+        self._lock = Lock()
+        self._ports: Dict[Optional[str], int] = {}
+        self._start = perf_counter_ns()
+        self._records = 0
+        self._flushed = 0
+        self._file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, 1, time()))
+        self._closed = Event()
+        self._flusher = Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def create(cls, directory: Path) -> 'JournalWriter':
+        '''A journal in directory named after the time it started, unique even among pianos started together.'''
+        name = f'{datetime.now():%Y%m%d-%H%M%S}-{getpid()}'
+        path = directory/f'{name}{JOURNAL_SUFFIX}'
+        count = 1
+        while True:
+            try:
+                return cls(path)
+            except FileExistsError:
+                path = directory/f'{name}-{count}{JOURNAL_SUFFIX}'
+                count += 1
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def records(self) -> int:
+        return self._records
+
+    def write(self, source: Optional[str], msg: Message) -> None:
+        data = msg.bytes()
+        if len(data) > 4:
+            return
+        # Ports call back from threads of their own
+        with self._lock:
+            port = self._ports.get(source)
+            if port is None:
+                port = self._declare(source)
+            self._file.write(JOURNAL_RECORD.pack(perf_counter_ns() - self._start, port, RECORD_MESSAGE, len(data), bytes(data)))
+            self._records += 1
+
+    def close(self) -> None:
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._file.close()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(JOURNAL_FLUSH_INTERVAL):
+            with self._lock:
+                if self._records != self._flushed:
+                    self._file.flush()
+                    self._flushed = self._records
+
+    def _declare(self, source: Optional[str]) -> int:
+        port = len(self._ports)
+        self._ports[source] = port
+        name = (source or '').encode()
+        chunks = -(-len(name) // JOURNAL_RECORD.size)
+        self._file.write(JOURNAL_RECORD.pack(perf_counter_ns() - self._start, port, RECORD_PORT, chunks, b''))
+        self._file.write(name.ljust(chunks * JOURNAL_RECORD.size, b'\0'))
+        return port
+
+def read_journal(path: Path) -> Tuple[List[str], List[Tuple[int, str, Message]]]:
+    '''Returns the ports of a journal and its messages as (nanoseconds, port, message).'''
+    with open(path, 'rb') as journal:
+        magic, version, _ = JOURNAL_HEADER.unpack(journal.read(JOURNAL_HEADER.size))
+        if magic != JOURNAL_MAGIC or version != 1:
+            raise ValueError(f'{path} is not a MIDI journal')
+        data = journal.read()
+
+    ports: Dict[int, str] = {}
+    messages = []
+    # A recording cut short can end part way through a record
+    end = len(data) - len(data) % JOURNAL_RECORD.size
+    offset = 0
+    while offset < end:
+        stamp, port, kind, size, payload = JOURNAL_RECORD.unpack_from(data, offset)
+        offset += JOURNAL_RECORD.size
+        if kind == RECORD_PORT:
+            name_size = size * JOURNAL_RECORD.size
+            ports[port] = data[offset:offset + name_size].rstrip(b'\0').decode()
+            offset += name_size
+        elif kind == RECORD_MESSAGE:
+            messages.append((stamp, ports[port], Message.from_bytes(payload[:size])))
+    return list(ports.values()), messages
+
+class ReplayPort(BaseInput):
+
+    def _open(self, callback: Optional[Callable[[Message], None]] = None, **kwargs) -> None:
+        self.callback = callback
+
+class JournalReplay(Thread):
+    '''Plays a journal back through the ports it was recorded from.
+
+    It stands in for mido.open_input and mido.get_input_names, so the messages take the same path through the
+    device manager as a keyboard's would. Playback starts once every port of the journal has been opened and
+    runs speed times as fast as it was recorded, 0 sends every message as fast as possible.
+    '''
+
+    def __init__(self, path: Path, speed: float = 1.0, on_finished: Optional[Callable[[], None]] = None) -> None:
+        Thread.__init__(self, daemon=True)
+        # Decoding is done up front so it doesn't slow the replay down
+        self._names, self._messages = read_journal(path)
+        self._speed = speed
+        self._on_finished = on_finished
+        self._ports: Dict[str, ReplayPort] = {}
+        self._opened = Event()
+        if not self._names:
+            self._opened.set()
+        self._stopped = Event()
+        self._lateness: List[float] = []
+
+    @property
+    def messages(self) -> int:
+        return len(self._messages)
+
+    @property
+    def duration(self) -> float:
+        return self._messages[-1][0] / 1e9 if self._messages else 0.0
+
+    @property
+    def lateness(self) -> List[float]:
+        return self._lateness
+
+    def list_names(self) -> List[str]:
+        return list(self._names)
+
+    def open(self, name: str, **kwargs) -> ReplayPort:
+        port = ReplayPort(name, **kwargs)
+        self._ports[name] = port
+        if all(name in self._ports for name in self._names):
+            self._opened.set()
+        return port
+
+    def run(self) -> None:
+        self._opened.wait()
+        start = perf_counter()
+        for stamp, name, msg in self._messages:
+            if self._stopped.is_set():
+                break
+            if self._speed:
+                due = start + stamp / 1e9 / self._speed
+                wait = due - perf_counter()
+                if wait > 0:
+                    sleep(wait)
+                self._lateness.append(perf_counter() - due)
+            port = self._ports[name]
+            if port.callback and not port.closed:
+                port.callback(msg)
+        if self._on_finished:
+            self._on_finished()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._opened.set()
@@ -0,0 +1,243 @@
+from bisect       import bisect_left
+from http.server  import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json         import dumps
+from pathlib      import Path
+from threading    import Thread, Event
+from time         import time
+from typing       import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Latency buckets in seconds, from 10 us to 1 s in steps of about 2.5x
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, .1, .25, .5, 1.)
+
+class Counter(object):
+    '''A count that only goes up. Updates skip locking, each counter is expected to be bumped from a single thread.'''
+
+    def __init__(self, name: str, description: str) -> None:
+        self._name = name
+        self._description = description
+        self._value = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def inc(self, amount: int = 1) -> None:
+        self._value += amount
+
+class Gauge(object):
+    '''A value read from its owner whenever the metrics are exported, so it costs nothing on the way there.'''
+
+    def __init__(self, name: str, description: str, read: Callable[[], float], kind: str = 'gauge') -> None:
+        self._name = name
+        self._description = description
+        self._read = read
+        # Totals kept by other objects, like the cache hits, are exported as counters
+        self._kind = kind
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def kind(self) -> str:
+        return self._kind
+
+    @property
+    def value(self) -> float:
+        return self._read()
+
+    def bind(self, read: Callable[[], float]) -> None:
+        self._read = read
+
+class Histogram(object):
+    '''Counts observations into fixed buckets, updates skip locking like Counter.'''
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self._name = name
+        self._description = description
+        self._bounds = tuple(buckets)
+        # The last count is everything above the highest bound
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def bounds(self) -> Tuple[float, ...]:
+        return self._bounds
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def cumulative(self) -> List[int]:
+        total = 0
+        counts = []
+        for count in self._counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q: float) -> Optional[float]:
+        # The upper bound of the bucket the quantile falls in, so it errs on the slow side
+        if self._count == 0:
+            return None
+        rank = q * self._count
+        for bound, count in zip(self._bounds + (float('inf'),), self.cumulative()):
+            if count >= rank:
+                return bound
+        return float('inf')
+
+Metric = Union[Counter, Gauge, Histogram]
+
+class MetricsRegistry(object):
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def __iter__(self):
+        return iter(list(self._metrics.values()))
+
+    def __getitem__(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(name, lambda: Counter(name, description))
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, description, buckets))
+
+    def gauge(self, name: str, description: str, read: Callable[[], float], kind: str = 'gauge') -> Gauge:
+        # A new owner of a gauge, like a replacement sound manager, takes over where it's read from
+        gauge = self._register(name, lambda: Gauge(name, description, read, kind))
+        gauge.bind(read)
+        return gauge
+
+    def snapshot(self) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for metric in self:
+            if isinstance(metric, Histogram):
+                values[metric.name] = {'count': metric.count, 'sum': metric.sum, 'p50': metric.quantile(.5), 'p99': metric.quantile(.99)}
+            else:
+                values[metric.name] = metric.value
+        return values
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in self:
+            name = f'fartpiano_{metric.name}'
+            lines.append(f'# HELP {name} {metric.description}')
+            if isinstance(metric, Histogram):
+                lines.append(f'# TYPE {name} histogram')
+                for bound, count in zip(metric.bounds + (float('inf'),), metric.cumulative()):
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+                lines.append(f'{name}_sum {metric.sum}')
+                lines.append(f'{name}_count {metric.count}')
+            else:
+                kind = metric.kind if isinstance(metric, Gauge) else 'counter'
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {metric.value}')
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, name: str, create: Callable[[], Metric]) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics.setdefault(name, create())
+        return metric
+
+class JsonLinesExporter(Thread):
+
+    def __init__(self, registry: MetricsRegistry, path: Path, interval: float = 10.0) -> None:
+        Thread.__init__(self, daemon=True)
+        self._registry = registry
+        self._path = path
+        self._interval = interval
+        self._stopped = Event()
+
+    def run(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path, 'a') as output:
+            while not self._stopped.wait(self._interval):
+                self._write(output)
+            # One last line so the end of the session isn't lost
+            self._write(output)
+
+    def _write(self, output) -> None:
+        output.write(dumps({'time': time(), **self._registry.snapshot()}) + '\n')
+        output.flush()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+class PrometheusExporter(Thread):
+    '''Serves the metrics in Prometheus' text format on /metrics, only on localhost unless told otherwise.'''
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = '127.0.0.1') -> None:
+        Thread.__init__(self, daemon=True)
+        exporter_registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter_registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def run(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+_registry: MetricsRegistry = None
+
+def get_metrics() -> MetricsRegistry:
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+    return _registry
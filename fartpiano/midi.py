@@ -1,23 +1,43 @@
-from enum      import Enum
-from abc       import ABC, abstractmethod
-from typing    import List
-from threading import Thread
-from mido      import open_input
+from enum        import Enum
+from abc         import ABC, abstractmethod
+from collections import deque
+from fnmatch     import fnmatchcase
+from re          import compile as compile_regex
+from typing      import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+from threading   import Thread, Event, Condition, Lock
+from time        import perf_counter
+from warnings    import warn
+from mido        import Message, get_input_names, open_input
+from mido.ports  import BaseInput
 
-from .pitch import Pitch 
+from .pitch   import Pitch
+from .metrics import MetricsRegistry, get_metrics
+from .engine  import BLOCK_SIZE, SAMPLE_RATE
+from .journal import JournalWriter
+
+if TYPE_CHECKING:
+    from asyncio import AbstractEventLoop
 
 class MIDIEventType(Enum):
     PRESS   = 0
     RELEASE = 1
+    PROGRAM = 2
 
 class MIDIEvent(object):
 
-    def __init__(self, event: MIDIEventType, note: str, velocity: float) -> None:
+    def __init__(self, event: MIDIEventType, note: str, velocity: float, program: Optional[int] = None,
+                 source: Optional[str] = None, channel: int = 0) -> None:
         self._event = event
-        self._note = Pitch.from_midi(note)
+        # Program changes aren't about a key, they carry the program picked instead
+        self._note = Pitch.from_midi(note) if note is not None else None
         self._velocity = velocity
+        self._program = program
+        self._source = source
+        self._channel = channel
 
     def __str__(self) -> str:
+        if self._event == MIDIEventType.PROGRAM:
+            return f'{self._event.name} {self._program}'
         return f'{self._event.name} {self._note}'
 
     @property
@@ -31,6 +51,18 @@ class MIDIEvent(object):
     @property
     def velocity(self) -> float:
         return self._velocity
+
+    @property
+    def program(self) -> Optional[int]:
+        return self._program
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._source
+
+    @property
+    def channel(self) -> int:
+        return self._channel
     
 class MIDIEventListener(ABC):
     
@@ -38,34 +70,291 @@ class MIDIEventListener(ABC):
     def on_midi_event(self, event: MIDIEvent) -> None:
         raise NotImplementedError(f'{type(self).__name__} does not implement on_midi_event')
 
+class AsyncMIDIEventListener(MIDIEventListener):
+
+    def __init__(self, loop: Optional['AbstractEventLoop'] = None) -> None:
+        # asyncio takes a good part of the start up to import and only this listener needs it
+        from asyncio import Queue, get_running_loop
+        # Events arrive on the MIDI thread and are handed to the loop that created the listener
+        self._loop = loop or get_running_loop()
+        self._queue: Queue = Queue()
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    async def get(self) -> MIDIEvent:
+        return await self._queue.get()
+
+    def __aiter__(self) -> 'AsyncMIDIEventListener':
+        return self
+
+    async def __anext__(self) -> MIDIEvent:
+        return await self._queue.get()
+
+class OverflowPolicy(Enum):
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    BLOCK       = 'block'
+
+# A press and release closer together than one mixer block would never be heard
+COALESCE_WINDOW = BLOCK_SIZE / SAMPLE_RATE
+
+class ListenerQueue(Thread, MIDIEventListener):
+    '''Hands events to a listener on a thread of its own, so a slow listener never holds up reading the port.
+
+    At most size events wait in the queue. When it's full the overflow policy picks a key press to drop, releases
+    are never dropped so no note is left hanging, and the port waits for room when there is no press to drop.
+    With coalescing a key pressed and let go within coalesce_window seconds, both still waiting, is skipped altogether.
+    A release followed by a press is a key struck again and is always played.
+    '''
+
+    def __init__(self, listener: MIDIEventListener, size: int = 64, overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 coalesce: bool = True, metrics: Optional[MetricsRegistry] = None, coalesce_window: float = COALESCE_WINDOW) -> None:
+        Thread.__init__(self, daemon=True)
+        self._listener = listener
+        self._size = size
+        self._overflow = overflow
+        self._coalesce = coalesce
+        self._coalesce_window = coalesce_window
+        self._events: Deque[Tuple[MIDIEvent, float]] = deque()
+        self._ready = Condition()
+        self._running = True
+        self._high_water = 0
+
+        metrics = metrics or get_metrics()
+        name = type(listener).__name__.lower()
+        self._dropped = metrics.counter('midi_events_dropped', 'Key presses dropped because a listener queue was full')
+        self._coalesced = metrics.counter('midi_events_coalesced', 'Events cancelled out by the opposite event for the same key before they were handled')
+        self._waited = metrics.histogram(f'{name}_queue_wait_seconds', f'Time events wait in the queue of {type(listener).__name__}')
+        self._handled = metrics.histogram(f'{name}_event_seconds', f'Time {type(listener).__name__} takes to handle an event')
+
+    @property
+    def listener(self) -> MIDIEventListener:
+        return self._listener
+
+    @property
+    def depth(self) -> int:
+        return len(self._events)
+
+    @property
+    def high_water(self) -> int:
+        return self._high_water
+
+    def on_midi_event(self, event: MIDIEvent) -> None:
+        with self._ready:
+            if self._coalesce and self._cancel(event):
+                return
+            while len(self._events) >= self._size:
+                if not self._make_room(event):
+                    return
+            self._events.append((event, perf_counter()))
+            self._high_water = max(self._high_water, len(self._events))
+            self._ready.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self._ready:
+                while self._running and not self._events:
+                    self._ready.wait()
+                if not self._running:
+                    return
+                event, queued = self._events.popleft()
+                self._ready.notify_all()
+            start = perf_counter()
+            self._waited.observe(start - queued)
+            self._listener.on_midi_event(event)
+            self._handled.observe(perf_counter() - start)
+
+    def stop(self) -> None:
+        with self._ready:
+            self._running = False
+            self._ready.notify_all()
+
+    def _cancel(self, event: MIDIEvent) -> bool:
+        if event.event != MIDIEventType.RELEASE:
+            return False
+        # Only the latest waiting event for the key on the same keyboard can pair up, anything before it was already paired with it
+        now = perf_counter()
+        for index in range(len(self._events) - 1, -1, -1):
+            waiting, queued = self._events[index]
+            if waiting.note == event.note and waiting.source == event.source and waiting.event in (MIDIEventType.PRESS, MIDIEventType.RELEASE):
+                if waiting.event != MIDIEventType.PRESS or now - queued > self._coalesce_window:
+                    return False
+                del self._events[index]
+                self._coalesced.inc(2)
+                return True
+        return False
+
+    def _make_room(self, event: MIDIEvent) -> bool:
+        # Returns False when the new event is the one dropped
+        if self._overflow == OverflowPolicy.DROP_NEWEST and event.event == MIDIEventType.PRESS:
+            self._dropped.inc()
+            return False
+        if self._overflow != OverflowPolicy.BLOCK:
+            presses = [index for index, (waiting, _) in enumerate(self._events) if waiting.event == MIDIEventType.PRESS]
+            if presses:
+                del self._events[presses[0] if self._overflow == OverflowPolicy.DROP_OLDEST else presses[-1]]
+                self._dropped.inc()
+                return True
+        self._ready.wait(.1)
+        return self._running
+
+class PortMatcher(object):
+    '''Matches port names against a list of patterns.
+
+    Patterns are shell style globs, so a plain port name matches only itself, or regular expressions when they
+    start with re:.
+    '''
+
+    def __init__(self, patterns: Union[str, Sequence[str]]) -> None:
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self._patterns = [pattern.strip() for pattern in patterns if pattern.strip()]
+        self._regexes = [compile_regex(pattern[3:]) for pattern in self._patterns if pattern.startswith('re:')]
+        self._globs = [pattern for pattern in self._patterns if not pattern.startswith('re:')]
+
+    @property
+    def patterns(self) -> List[str]:
+        return self._patterns
+
+    def __call__(self, name: str) -> bool:
+        return any(fnmatchcase(name, glob) for glob in self._globs) or any(regex.search(name) for regex in self._regexes)
+
+    def select(self, names: Sequence[str]) -> List[str]:
+        return [name for name in names if self(name)]
+
 class MIDIDeviceManager(Thread):
+    '''Reads every input port matching the configured patterns and hands their events to the listeners.
 
-    def __init__(self, device_id: str) -> None:
+    The ports call back from their own threads as messages arrive and the events are handed on one at a time, so
+    listeners see a single stream tagged with the port and channel each event came from. The manager's thread
+    only wakes to rescan the ports, opening keyboards that were plugged in and closing ones that went away.
+    '''
+
+    def __init__(self, devices: Union[str, Sequence[str]], opener: Callable[..., BaseInput] = open_input, metrics: Optional[MetricsRegistry] = None,
+                 queue_size: int = 0, overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST, coalesce: bool = True,
+                 lister: Callable[[], List[str]] = get_input_names, rescan: float = 2.0, journal: Optional[JournalWriter] = None) -> None:
         Thread.__init__(self)
-        self._device_id = device_id
+        self._matcher = PortMatcher(devices)
+        self._opener = opener
+        self._lister = lister
+        self._rescan = rescan
+        # Every message read is recorded before it's filtered, so a replay sees what the piano saw
+        self._journal = journal
         self._listeners: List[MIDIEventListener] = []
         self._running = False
+        self._stopped = Event()
+
+        self._ports: Dict[str, BaseInput] = {}
+        # Keys held on each port as channel << 7 | note, let go for the listeners when the port disappears
+        self._held: Dict[Optional[str], Set[int]] = {None: set()}
+        self._dispatching = Lock()
+
+        # With a queue size every listener gets a ListenerQueue, 0 calls them straight from the port's thread
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._coalesce = coalesce
+        self._queues: List[ListenerQueue] = []
+
+        self._metrics = metrics or get_metrics()
+        self._events = self._metrics.counter('midi_events', 'Note messages received from the keyboard')
+        self._dispatch = self._metrics.histogram('midi_dispatch_seconds', 'Time taken to hand a note message to the listeners or their queues')
+        self._plugged = self._metrics.counter('midi_ports_opened', 'Input ports opened, including keyboards plugged in while playing')
+        self._unplugged = self._metrics.counter('midi_ports_closed', 'Input ports closed because they went away')
+        self._metrics.gauge('midi_ports', 'Input ports being read', lambda: len(self._ports))
+        self._metrics.gauge('midi_queue_depth', 'Events waiting in the listener queues', lambda: sum(queue.depth for queue in self._queues))
+        self._metrics.gauge('midi_queue_high_water', 'Most events that have waited in a listener queue', lambda: max((queue.high_water for queue in self._queues), default=0))
+
+    @property
+    def ports(self) -> List[str]:
+        return list(self._ports)
 
     def add_listener(self, listtener: MIDIEventListener) -> None:
+        if self._queue_size:
+            queue = ListenerQueue(listtener, self._queue_size, self._overflow, self._coalesce, self._metrics)
+            queue.start()
+            self._queues.append(queue)
+            listtener = queue
         self._listeners.append(listtener)
 
     def run(self) -> None:
         self._running = True
-        with open_input(self._device_id) as midi_in:
-            while self._running:
-                for msg in midi_in.iter_pending():
-                    if msg.type == 'note_on':
-                        event = MIDIEvent(MIDIEventType.PRESS, msg.note, msg.velocity)
-                    elif msg.type == 'note_off':
-                        event = MIDIEvent(MIDIEventType.RELEASE, msg.note, msg.velocity)
-                    else:
-                        continue
-                    self._notify_listeners(event)
+        try:
+            self._scan()
+            if not self._ports:
+                waiting = ', waiting for one to be plugged in' if self._rescan else ''
+                warn(f'No MIDI input matches {", ".join(self._matcher.patterns)}{waiting}')
+            while not self._stopped.is_set():
+                # Without rescans this sleeps until stopped
+                if not self._stopped.wait(self._rescan or None):
+                    self._scan()
+        finally:
+            for name in list(self._ports):
+                self._close(name)
+
+    def _scan(self) -> None:
+        available = self._matcher.select(self._lister())
+        for name in list(self._ports):
+            if name not in available:
+                self._close(name)
+                self._unplugged.inc()
+        for name in available:
+            if name not in self._ports:
+                self._open(name)
+
+    def _open(self, name: str) -> None:
+        # A message from the new port waits for the lock, so it finds its held keys once the port is open
+        with self._dispatching:
+            try:
+                self._ports[name] = self._opener(name, callback=lambda msg: self._on_message(msg, name))
+            except OSError as e:
+                # It can go away again between being listed and being opened, the next scan tries again
+                warn(f'Could not open MIDI input {name}: {e}')
+                return
+            self._held[name] = set()
+        self._plugged.inc()
+
+    def _close(self, name: str) -> None:
+        port = self._ports.pop(name)
+        port.close()
+        with self._dispatching:
+            for key in sorted(self._held.pop(name, ())):
+                self._notify_listeners(MIDIEvent(MIDIEventType.RELEASE, key & 127, 0, None, name, key >> 7))
+
+    def _on_message(self, msg: Message, source: Optional[str] = None) -> None:
+        if self._journal:
+            self._journal.write(source, msg)
+        if msg.type == 'note_on' and msg.velocity > 0:
+            event = MIDIEvent(MIDIEventType.PRESS, msg.note, msg.velocity, None, source, msg.channel)
+        # Plenty of keyboards let go of keys with a note on at zero velocity
+        elif msg.type in ('note_on', 'note_off'):
+            event = MIDIEvent(MIDIEventType.RELEASE, msg.note, msg.velocity, None, source, msg.channel)
+        elif msg.type == 'program_change':
+            event = MIDIEvent(MIDIEventType.PROGRAM, None, 0, msg.program, source, msg.channel)
+        else:
+            return
+        # Ports call back from threads of their own, listeners get one event at a time
+        with self._dispatching:
+            held = self._held.get(source)
+            # The port was closed while the message was on its way, its keys have already been let go
+            if held is None:
+                return
+            if event.event == MIDIEventType.PRESS:
+                held.add(msg.channel << 7 | msg.note)
+            elif event.event == MIDIEventType.RELEASE:
+                held.discard(msg.channel << 7 | msg.note)
+            self._notify_listeners(event)
 
     def _notify_listeners(self, event: MIDIEvent) -> None:
+        start = perf_counter()
         for listener in self._listeners:
             listener.on_midi_event(event)
+        self._dispatch.observe(perf_counter() - start)
+        self._events.inc()
 
     def stop(self) -> None:
         self._running = False
-
+        self._stopped.set()
+        for queue in self._queues:
+            queue.stop()
+            queue.join()
@@ -0,0 +1,171 @@
+from json    import dumps, loads
+from mmap    import mmap, ACCESS_READ
+from pathlib import Path
+from struct  import Struct
+from typing  import BinaryIO, Dict, Iterable, Optional, Tuple
+from zipfile import ZipFile
+from numpy   import ndarray, ascontiguousarray, frombuffer, int16
+
+from .sample import Bank, Sample, SAMPLE_FORMAT
+from .pitch  import Pitch
+from .cache  import SampleSounds, convert, decode
+from .engine import SAMPLE_RATE, CHANNELS
+
+# A packed bank is one file: a fixed header, the PCM of every segment in the
+# mixer's format starting on a page boundary, then a JSON index at the end
+# giving the bank layout and where each segment lives in the file
+PACKED_SUFFIX = '.fpb'
+
+_MAGIC      = b'FARTPACK'
+_VERSION    = 1
+_HEADER     = Struct('<8sIQI')  # magic, version, index offset, index length
+_DATA_START = 4096
+_ALIGNMENT  = 16
+_SEGMENTS   = ('attack', 'sustain', 'decay')
+
+class PackedBank(object):
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        with open(path, 'rb') as pack_file:
+            self._map = mmap(pack_file.fileno(), 0, access=ACCESS_READ)
+
+        magic, version, index_offset, index_length = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a packed bank')
+        if version != _VERSION:
+            raise ValueError(f'{path} is packed bank version {version}, expected {_VERSION}')
+        index = loads(self._map[index_offset:index_offset + index_length])
+
+        self._rate = index['rate']
+        self._channels = index['channels']
+        self._bank = Bank.from_dict(index)
+        self._bank.load(path.parent, self)
+
+        self._sounds: Dict[Pitch, SampleSounds] = {}
+        for entry in index['samples']:
+            pitch = Pitch.from_string(entry['pitch'])
+            segments = [self._segment(*entry['data'][segment]) for segment in _SEGMENTS]
+            self._sounds[pitch] = SampleSounds(pitch, *segments)
+        self._stored = len(self._sounds)
+
+    def __str__(self) -> str:
+        return f'Packed {self._bank}: {self._path}'
+
+    def __len__(self) -> int:
+        return len(self._sounds)
+
+    def __contains__(self, pitch: Pitch) -> bool:
+        return pitch in self._sounds
+
+    @property
+    def bank(self) -> Bank:
+        return self._bank
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def budget(self) -> Optional[int]:
+        return None
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    def get(self, sample: Sample) -> SampleSounds:
+        sounds = self._sounds.get(sample.pitch)
+        if sounds is None:
+            # Pitches between the stored samples are resampled from their zone's sample once and kept
+            sounds = self._sounds[sample.source].repitched(sample.pitch)
+            self._sounds[sample.pitch] = sounds
+        return sounds
+
+    def preload(self, samples: Iterable[Sample]) -> None:
+        # Ask the kernel to start reading the file in, the pages stay shared page cache
+        if hasattr(self._map, 'madvise'):
+            from mmap import MADV_WILLNEED
+            self._map.madvise(MADV_WILLNEED)
+        for sample in samples:
+            if sample.pitch not in self._sounds:
+                self.get(sample)
+
+    def clear(self) -> None:
+        # The stored samples are views of the mapped file and cost nothing to keep, the resampled ones are dropped
+        for pitch in list(self._sounds)[self._stored:]:
+            del self._sounds[pitch]
+
+    def close(self) -> None:
+        self._sounds.clear()
+        self._map.close()
+
+    def _segment(self, offset: int, frames: int) -> ndarray:
+        # A view straight into the mapped file, nothing is copied unless the format is off
+        y = frombuffer(self._map, dtype=int16, count=frames * self._channels, offset=offset).reshape(frames, self._channels)
+        if self._rate != SAMPLE_RATE or self._channels != CHANNELS:
+            y = convert(y, self._rate, SAMPLE_RATE, CHANNELS)
+        return y
+
+def read_packed_bank(path: Path) -> Bank:
+    return PackedBank(path).bank
+
+def write_packed_bank(bank: Bank, sounds: Iterable[SampleSounds], output: Path, rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> Path:
+    index = bank.to_dict()
+    index['rate'] = rate
+    index['channels'] = channels
+    index['sample_format'] = SAMPLE_FORMAT
+    entries = {entry['pitch']: entry for entry in index['samples']}
+
+    with open(output, 'wb') as pack_file:
+        pack_file.write(bytes(_DATA_START))
+        for sample_sounds in sounds:
+            data = {}
+            for segment in _SEGMENTS:
+                data[segment] = _write_segment(pack_file, getattr(sample_sounds, segment))
+            entries[str(sample_sounds.pitch)]['data'] = data
+
+        index_bytes = dumps(index).encode()
+        index_offset = pack_file.tell()
+        pack_file.write(index_bytes)
+        pack_file.seek(0)
+        pack_file.write(_HEADER.pack(_MAGIC, _VERSION, index_offset, len(index_bytes)))
+    return output
+
+def _write_segment(pack_file: BinaryIO, y: ndarray) -> Tuple[int, int]:
+    padding = -pack_file.tell() % _ALIGNMENT
+    pack_file.write(bytes(padding))
+    offset = pack_file.tell()
+    pack_file.write(ascontiguousarray(y, dtype=int16).tobytes())
+    return offset, len(y)
+
+def pack_bank(source: Path, output_dir: Optional[Path] = None) -> Path:
+    '''Converts a bank archive made by create_bank, or an installed bank directory, into a packed bank.'''
+    if source.is_dir():
+        bank_dict = loads((source/f'{source.name}.json').read_text())
+        open_segment = lambda name: open(source/name, 'rb')
+        archive = None
+    else:
+        archive = ZipFile(source)
+        index_name = next(name for name in archive.namelist() if name.endswith('.json'))
+        bank_dict = loads(archive.read(index_name))
+        open_segment = archive.open
+
+    try:
+        bank = Bank.from_dict(bank_dict)
+        if bank is None:
+            raise ValueError(f'{source} does not describe a valid bank')
+
+        def decoded() -> Iterable[SampleSounds]:
+            for pitch, sample in bank.samples.items():
+                segments = []
+                for segment in (sample.attack, sample.sustain, sample.decay):
+                    with open_segment(segment.name) as segment_file:
+                        segments.append(decode(segment_file))
+                yield SampleSounds(pitch, *segments)
+
+        output_dir = output_dir or source.parent
+        return write_packed_bank(bank, decoded(), output_dir/f'{bank.name}{PACKED_SUFFIX}')
+    finally:
+        if archive:
+            archive.close()
@@ -1,18 +1,46 @@
-from .midi    import MIDIEventListener, MIDIEvent, MIDIEventType
-from .sampler import Bank
-from .sound   import SoundManager, init_sound
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+from .midi     import MIDIEventListener, MIDIEvent, MIDIEventType
+from .pitch    import Pitch
+from .sampler  import Bank
+from .sound    import SoundManager, init_sound
+from .engine   import VoiceStealer
+from .prefetch import KeyHistory
 
 class Piano(MIDIEventListener):
 
-    def __init__(self, bank: Bank, single_loop_mode: bool = False) -> None:
+    def __init__(self, bank: Bank, single_loop_mode: bool = False, prefetch: int = 0, history: Optional[KeyHistory] = None,
+                 voices: int = 16, stealer: Optional[VoiceStealer] = None, banks: Optional[Sequence[Bank]] = None) -> None:
         init_sound()
-        self._sound_manager = SoundManager(bank, single_loop_mode)
+        # Program changes pick from these, program 0 is the first
+        self._banks = banks or []
+        # The keyboards and channels holding each key, the note is let go when the last of them lets go
+        self._holders: Dict[Pitch, Set[Tuple[Optional[str], int]]] = {}
+        self._sound_manager = SoundManager(bank, single_loop_mode, voices=voices, prefetch=prefetch, history=history, stealer=stealer)
+
+    @property
+    def sound_manager(self) -> SoundManager:
+        return self._sound_manager
+
+    def close(self) -> None:
+        self._sound_manager.close()
 
     def on_midi_event(self, event: MIDIEvent) -> None:
         if event.event == MIDIEventType.PRESS:
-            self._sound_manager.attack(event.note)
-        elif event.event == MIDIEventType.RELEASE: 
-            self._sound_manager.release(event.note)
+            holders = self._holders.setdefault(event.note, set())
+            if not holders:
+                self._sound_manager.attack(event.note)
+            holders.add((event.source, event.channel))
+        elif event.event == MIDIEventType.RELEASE:
+            holders = self._holders.get(event.note)
+            if holders:
+                holders.discard((event.source, event.channel))
+            # A release nobody is known to hold still lets go, a press dropped on the way in never leaves a note hanging
+            if not holders:
+                self._holders.pop(event.note, None)
+                self._sound_manager.release(event.note)
+        elif event.event == MIDIEventType.PROGRAM and event.program < len(self._banks):
+            self._sound_manager.switch_bank(self._banks[event.program])
 
 
 
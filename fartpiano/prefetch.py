@@ -0,0 +1,77 @@
+from collections import Counter, deque
+from json        import dumps, loads
+from pathlib     import Path
+from threading   import Thread, Event
+from typing      import Deque, Iterable, List
+
+from .sample import Bank
+from .pitch  import Pitch
+from .cache  import SoundCache
+
+class KeyHistory(object):
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._counts: Counter = Counter()
+        if path.exists():
+            for name, count in loads(path.read_text()).items():
+                pitch = Pitch.from_string(name)
+                if pitch:
+                    self._counts[pitch] = count
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def record(self, pitch: Pitch) -> None:
+        self._counts[pitch] += 1
+
+    def most_played(self, count: int) -> List[Pitch]:
+        return [pitch for pitch, _ in self._counts.most_common(count)]
+
+    def save(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._path.write_text(dumps({str(pitch): count for pitch, count in self._counts.items()}, indent=4))
+
+class Prefetcher(Thread):
+
+    def __init__(self, cache: SoundCache, bank: Bank, neighbours: int = 2, backlog: int = 64) -> None:
+        Thread.__init__(self, daemon=True)
+        self._target = (cache, bank)
+        self._neighbours = neighbours
+        # Newest requests are taken first, once the backlog is full the stalest ones fall off the end
+        self._pending: Deque[Pitch] = deque(maxlen=backlog)
+        self._wake = Event()
+        self._running = False
+
+    def retarget(self, cache: SoundCache, bank: Bank) -> None:
+        # Keys asked for in the old bank are of no use in the new one
+        self._pending.clear()
+        self._target = (cache, bank)
+
+    def request(self, pitches: Iterable[Pitch]) -> None:
+        self._pending.extendleft(reversed(list(pitches)))
+        self._wake.set()
+
+    def around(self, pitch: Pitch) -> None:
+        # Closest keys first, they are the likeliest to be played next
+        self.request(pitch + step for distance in range(1, self._neighbours + 1) for step in (distance, -distance))
+
+    def run(self) -> None:
+        self._running = True
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            while self._running and self._pending:
+                cache, bank = self._target
+                try:
+                    sample = bank.sample(self._pending.popleft())
+                except IndexError:
+                    # Emptied by a retarget since it was checked
+                    break
+                if sample is not None:
+                    cache.prefetch(sample)
+
+    def stop(self) -> None:
+        self._running = False
+        self._wake.set()
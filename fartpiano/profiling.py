@@ -0,0 +1,123 @@
+from contextlib import contextmanager, nullcontext
+from json       import dumps
+from os         import getpid
+from pathlib    import Path
+from time       import perf_counter, process_time
+from typing     import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_IO_COUNTERS = Path('/proc/self/io')
+_STATUS      = Path('/proc/self/status')
+_CLEAR_REFS  = Path('/proc/self/clear_refs')
+
+def _io_counters() -> Tuple[Optional[int], Optional[int]]:
+    # Bytes the process asked to read and write, page cache hits included. Only Linux keeps these.
+    try:
+        counters = dict(line.split(': ') for line in _IO_COUNTERS.read_text().splitlines())
+    except OSError:
+        return None, None
+    return int(counters['rchar']), int(counters['wchar'])
+
+def _peak_memory() -> Optional[int]:
+    # The most resident memory the process has used since the peak was last reset
+    try:
+        for line in _STATUS.read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_memory() -> None:
+    # Linux drops the peak back to what is resident now, unlike tracing allocations this costs nothing while the stage runs
+    try:
+        _CLEAR_REFS.write_text('5')
+    except OSError:
+        pass
+
+def _delta(end: Optional[int], start: Optional[int]) -> Optional[int]:
+    return None if end is None or start is None else end - start
+
+class _Frame(object):
+
+    def __init__(self) -> None:
+        self.peak: Optional[int] = None
+
+    def update(self, peak: Optional[int]) -> None:
+        if peak is not None:
+            self.peak = peak if self.peak is None else max(self.peak, peak)
+
+# The memory peak belongs to the whole process, so the stages open in it are tracked together
+# even when they belong to different profilers, like a worker's stages run in the building process
+_frames: List[_Frame] = []
+
+class BuildProfiler(object):
+    '''Records the wall time, CPU time, bytes read and written and peak memory of each stage of a bank build.
+
+    A disabled profiler records nothing, so the build can mark its stages either way. Peak memory is the
+    resident size of the process and, like the bytes read and written, is only known on Linux.
+    '''
+
+    def __init__(self, enabled: bool = True) -> None:
+        self._enabled = enabled
+        self._records: List[Dict[str, Any]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        return self._records
+
+    def stage(self, name: str, **details: Any):
+        '''Times the body of the with block, the details it yields are added to the record and can be filled in.'''
+        if not self._enabled:
+            return nullcontext(details)
+        return self._measure(name, details)
+
+    @contextmanager
+    def _measure(self, name: str, details: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        # Each stage measures its own peak, an enclosing stage keeps the highest peak of everything inside it
+        if _frames:
+            _frames[-1].update(_peak_memory())
+        _reset_peak_memory()
+        frame = _Frame()
+        _frames.append(frame)
+
+        read, written = _io_counters()
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield details
+        finally:
+            wall, cpu = perf_counter() - wall, process_time() - cpu
+            end_read, end_written = _io_counters()
+            frame.update(_peak_memory())
+            _frames.pop()
+            if _frames:
+                _frames[-1].update(frame.peak)
+            _reset_peak_memory()
+
+            self._records.append({'stage': name, **details, 'wall': wall, 'cpu': cpu, 'read_bytes': _delta(end_read, read),
+                                  'written_bytes': _delta(end_written, written), 'peak_memory': frame.peak, 'pid': getpid()})
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        # Stages timed in worker processes are handed back with their results
+        self._records.extend(records)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        stages: Dict[str, Dict[str, Any]] = {}
+        for record in self._records:
+            stage = stages.setdefault(record['stage'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'read_bytes': 0, 'written_bytes': 0, 'peak_memory': 0})
+            stage['count'] += 1
+            stage['wall'] += record['wall']
+            stage['cpu'] += record['cpu']
+            stage['read_bytes'] += record['read_bytes'] or 0
+            stage['written_bytes'] += record['written_bytes'] or 0
+            stage['peak_memory'] = max(stage['peak_memory'], record['peak_memory'] or 0)
+        return stages
+
+    def report(self, **settings: Any) -> Dict[str, Any]:
+        return {'settings': settings, 'stages': self.summary(), 'records': self._records}
+
+    def write(self, path: Path, **settings: Any) -> None:
+        path.write_text(dumps(self.report(**settings), indent=4, default=str))
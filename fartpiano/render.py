@@ -0,0 +1,57 @@
+from pathlib   import Path
+from typing    import Iterator, Optional, Tuple
+from mido      import MidiFile
+from soundfile import SoundFile
+
+from .sample import Bank
+from .pitch  import Pitch
+from .cache  import SoundCache
+from .engine import VoiceEngine, VoiceStealer, SAMPLE_RATE, CHANNELS
+
+# Nobody is listening while rendering, so the blocks can be much larger than the mixer's
+RENDER_BLOCK_SIZE = 8192
+
+def read_note_events(midi_file: Path) -> Iterator[Tuple[int, Pitch, bool]]:
+    '''Yields the frame, pitch and whether the key went down for every note in the file, in the order they play.'''
+    seconds = 0.0
+    # Iterating a MidiFile merges the tracks and gives the time since the last message in seconds
+    for msg in MidiFile(midi_file):
+        seconds += msg.time
+        if msg.type == 'note_on' and msg.velocity > 0:
+            yield int(round(seconds * SAMPLE_RATE)), Pitch.from_midi(msg.note), True
+        # Files commonly end notes with a note on at zero velocity
+        elif msg.type in ('note_on', 'note_off'):
+            yield int(round(seconds * SAMPLE_RATE)), Pitch.from_midi(msg.note), False
+
+def render_midi(midi_file: Path, bank: Bank, output: Path, single_loop_mode: bool = False, voices: int = 16,
+                block_size: int = RENDER_BLOCK_SIZE, tail: float = 10.0, stealer: Optional[VoiceStealer] = None) -> int:
+    '''Plays a MIDI file through the bank into an audio file without an audio device, returning the number of frames written.
+
+    The format is picked from the extension of the output, wav and flac both work. Once the last note is released
+    the decays are rendered for up to tail seconds, anything still sounding after that is cut off.
+    '''
+    cache = bank.cache if bank.cache is not None else SoundCache()
+    engine = VoiceEngine(voices, CHANNELS, block_size, stealer)
+    written = 0
+
+    with SoundFile(output, 'w', SAMPLE_RATE, CHANNELS, subtype='PCM_16') as out:
+        for frame, pitch, pressed in read_note_events(midi_file):
+            # Render up to the event so it lands on its exact frame, not the next block boundary
+            while written < frame:
+                block = engine.render(min(block_size, frame - written))
+                out.write(block)
+                written += len(block)
+            if not pressed:
+                engine.release(pitch)
+                continue
+            sample = bank.sample(pitch)
+            if sample is not None:
+                engine.attack(pitch, cache.get(sample), single_loop_mode)
+
+        end = written + int(tail * SAMPLE_RATE)
+        while not engine.idle and written < end:
+            block = engine.render(min(block_size, end - written))
+            out.write(block)
+            written += len(block)
+
+    return written
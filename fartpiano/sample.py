@@ -1,18 +1,18 @@
-from librosa         import load as rosa_load, piptrack
-from librosa.feature import rms as rms_calculation
-from numpy           import arange, max as np_max, where as np_where, argmax, ndarray
 from pathlib         import Path
-from soundfile       import write as sf_write
-from typing          import Tuple, Dict, Any
+from typing          import Dict, Any, List, Optional
 from .pitch          import Pitch
 
+# Banks are built as 16 bit PCM, the same as the mixer plays
+SAMPLE_FORMAT = 'PCM_16'
+
 class Sample(object):
 
-    def __init__(self, attack: Path, sustain: Path, decay: Path, pitch: Pitch) -> None:
+    def __init__(self, attack: Path, sustain: Path, decay: Path, pitch: Pitch, source: Optional[Pitch] = None) -> None:
         self._attack = attack
         self._sustain = sustain
         self._decay = decay
         self._pitch = pitch
+        self._source = source or pitch
         self._attack_sample = None
         self._sustain_sample = None
         self._decay_sample = None
@@ -35,6 +35,11 @@ class Sample(object):
     @property
     def pitch(self) -> Pitch:
         return self._pitch
+
+    @property
+    def source(self) -> Pitch:
+        # The pitch the audio was recorded at, a sample borrowed from a neighbour is resampled to its own pitch
+        return self._source
     
     def load(self, sample_root: Path) -> None:
         self._attack = sample_root/self.attack.name
@@ -63,9 +68,15 @@ class Sample(object):
     
 class Bank(object):
 
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, rate: Optional[int] = None, channels: Optional[int] = None, sample_format: Optional[str] = None) -> None:
         self._name = name
+        self._rate = rate
+        self._channels = channels
+        self._sample_format = sample_format
         self._samples: Dict[Pitch, Sample] = {}
+        self._zones: Dict[Pitch, Pitch] = {}
+        self._derived: Dict[Pitch, Sample] = {}
+        self._cache = None
 
     def __str__(self) -> str:
         return f'Sample Bank: {self._name}'
@@ -78,69 +89,91 @@ class Bank(object):
     def samples(self) -> Dict[Pitch, Sample]:
         return self._samples
 
+    @property
+    def zones(self) -> Dict[Pitch, Pitch]:
+        # Every playable pitch and the pitch of the sample it is played from,
+        # a bank without zones plays only the pitches it has samples for
+        return self._zones or {pitch: pitch for pitch in self._samples}
+
+    @property
+    def rate(self) -> Optional[int]:
+        return self._rate
+
+    @property
+    def channels(self) -> Optional[int]:
+        return self._channels
+
+    @property
+    def sample_format(self) -> Optional[str]:
+        return self._sample_format
+
+    @property
+    def cache(self) -> Any:
+        return self._cache
+
     def to_dict(self) -> Dict[str, Any]:
-        return {
-            'name': self.name,
-            'samples': [self.samples[pitch].to_dict() for pitch in self.samples]
-        }
+        bank_dict = {'name': self.name}
+        # Banks from before the format was recorded leave it out
+        if self.rate is not None:
+            bank_dict['rate'] = self.rate
+            bank_dict['channels'] = self.channels
+            bank_dict['sample_format'] = self.sample_format
+        bank_dict['samples'] = [self.samples[pitch].to_dict() for pitch in self.samples]
+        if self._zones:
+            bank_dict['zones'] = self._zones_to_list()
+        return bank_dict
     
     def add_sample(self, pitch: Pitch, sample: Sample) -> None:
         self._samples[pitch] = sample
 
-    def load(self, sample_intall_path: Path) -> None:
+    def add_zone(self, sample_pitch: Pitch, low: Pitch, high: Pitch) -> None:
+        for midi_note_number in range(low.midi, high.midi + 1):
+            self._zones[Pitch.from_midi(midi_note_number)] = sample_pitch
+        self._derived.clear()
+
+    def sample(self, pitch: Pitch) -> Optional[Sample]:
+        sample = self._samples.get(pitch) or self._derived.get(pitch)
+        if sample is None:
+            stored = self._samples.get(self._zones.get(pitch))
+            if stored is None:
+                return None
+            sample = Sample(stored.attack, stored.sustain, stored.decay, pitch, stored.pitch)
+            self._derived[pitch] = sample
+        return sample
+
+    def playable(self) -> List[Sample]:
+        return [self.sample(pitch) for pitch in sorted(self.zones)]
+
+    def _zones_to_list(self) -> List[Dict[str, str]]:
+        zones = []
+        for pitch in sorted(self._zones):
+            sample_pitch = self._zones[pitch]
+            if zones and zones[-1]['sample'] == str(sample_pitch) and Pitch.from_string(zones[-1]['high']) + 1 == pitch:
+                zones[-1]['high'] = str(pitch)
+            else:
+                zones.append({'sample': str(sample_pitch), 'low': str(pitch), 'high': str(pitch)})
+        return zones
+
+    def load(self, sample_intall_path: Path, cache: Any = None) -> None:
         sample_root = sample_intall_path/self.name
         if sample_root.exists():
             for sample_pitch in self.samples:
                 self.samples[sample_pitch].load(sample_root)
+        self._derived.clear()
+        self._cache = cache
     
     @classmethod
     def from_dict(cls, dict: Dict[str, Any]) -> 'Bank':
-        ret = Bank(dict['name'])
+        ret = Bank(dict['name'], dict.get('rate'), dict.get('channels'), dict.get('sample_format'))
         for sample in dict['samples']:
             new_sample = Sample.from_dict(sample)
             if not new_sample:
                 return None
             ret.add_sample(new_sample.pitch, new_sample)
+        for zone in dict.get('zones', []):
+            sample_pitch, low, high = (Pitch.from_string(zone[key]) for key in ('sample', 'low', 'high'))
+            if not sample_pitch or not low or not high:
+                return None
+            ret.add_zone(sample_pitch, low, high)
         return ret
         
-def define_boundries(file_path: Path, frame_length=2048, hop_length=512, attack_percent=.75, sustain_percent=0.5) -> Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]:
-    # Load the samples
-    y, sr = rosa_load(file_path, sr=None)
-    
-    # Calculate the intensity of the samples
-    rms = rms_calculation(y=y, frame_length=frame_length, hop_length=hop_length).flatten()
-
-    max_rms = np_max(rms)
-    attack_threshold = attack_percent * max_rms
-    sustain_threshold = sustain_percent * max_rms
-
-    attack_start = 0
-    attack_end = int(argmax(rms > attack_threshold))
-    sustain_start = attack_end + 1
-    sustain_end = int(sustain_start + argmax(rms[sustain_start:] < sustain_threshold))
-    decay_start = sustain_end + 1
-    decay_end = int(decay_start + argmax(rms[decay_start:] == 0))
-
-    ret = ((attack_start, attack_end * hop_length), (attack_end * hop_length, sustain_end * hop_length ), (sustain_end * hop_length, decay_end * hop_length))
-    return ret
-
-def create_sample(file_path: Path, pitch: Pitch, boundries: Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]) -> Sample:
-    
-    y, sr = rosa_load(file_path, sr=None)
-    
-    # Grab the sample buffers
-    attack_segment = y[boundries[0][0]:boundries[0][1]]
-    sustain_segment = y[boundries[1][0]:boundries[1][1]]
-    decay_segment = y[boundries[2][0]:boundries[2][1]]
-
-
-    attack_file = file_path.with_name(file_path.stem + '_attack.wav')
-    sustain_file = file_path.with_name(file_path.stem + '_sustain.wav')
-    decay_file = file_path.with_name(file_path.stem + '_decay.wav')
-
-    sf_write(attack_file, attack_segment, sr)
-    sf_write(sustain_file, sustain_segment, sr)
-    sf_write(decay_file, decay_segment, sr)
-
-    sample = Sample(attack_file, sustain_file, decay_file, pitch)
-    return sample
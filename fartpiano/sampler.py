@@ -1,68 +1,34 @@
 from pathlib import Path
-from typing  import Dict
-from json    import dumps, loads
+from typing  import Any, Dict, List, Optional
+from json    import loads
 from zipfile import ZipFile
+from warnings import warn
 
-from .sample import define_boundries, Sample, create_sample, Bank
-from .pitch  import Pitch, Note, correct_pitch, pitch_shift_sample
+from .sample import Bank
+from .cache  import SoundCache
+from .packed import PACKED_SUFFIX, pack_bank, read_packed_bank
+from .shared import shared_banks
+from .engine import SAMPLE_RATE, CHANNELS
 
 _banks: Dict[str, Bank] = None
 
-def create_bank(input_file: Path) -> None:
-    
-    # define the boundries from the input file
-    boundries = define_boundries(input_file)
-
-    files: Dict[Pitch, Path] = {}
-    bank = Bank(input_file.stem)
-
-    # Pitch correct the input file
-    corrected_file, corrected_pitch = correct_pitch(input_file)
-    files[corrected_pitch] = corrected_file
-
-    # Create a version for each pitch
-    for pitch in Pitch.iterate():
-        if pitch != corrected_pitch:
-            adjusted_file, adjusted_pitch = pitch_shift_sample(corrected_file, corrected_pitch, pitch)
-            files[adjusted_pitch] = adjusted_file
-
-    # Create a sample bank
-    for pitch in files:
-        new_sample = create_sample(files[pitch], pitch, boundries)
-        bank.add_sample(pitch, new_sample)
-        files[pitch].unlink()
-
-    # Create a bank discription
-    bank_file = input_file.parent/f'{bank.name}.json'
-    bank_file.write_text(dumps(bank.to_dict(), indent=4))
-
-
-    # Zip up the bank for importing
-    bank_zip = input_file.parent/f'{bank.name}.zip'
-    with ZipFile(bank_zip, 'w') as zip_file:
-        zip_file.write(bank_file, arcname=bank_file.name)
-        for sample_pitch in bank.samples:
-            sample = bank.samples[sample_pitch]
-            zip_file.write(sample.attack, arcname=sample.attack.name)
-            zip_file.write(sample.sustain, arcname=sample.sustain.name)
-            zip_file.write(sample.decay, arcname=sample.decay.name)
-
-    # Remove artifact files
-    bank_file.unlink()
-    for sample_pitch in bank.samples:
-        sample = bank.samples[sample_pitch]
-        sample.attack.unlink()
-        sample.sustain.unlink()
-        sample.decay.unlink()
-
-    print(f'Sample bank created: {bank_zip}')
-
-def install_bank(archive_path: Path, bank_install_path: Path) -> None:
+def __getattr__(name: str) -> Any:
+    # Building banks needs librosa, which is too slow to import on the way to playing
+    if name == 'create_bank':
+        from .builder import create_bank
+        return create_bank
+    raise AttributeError(f'module {__name__} has no attribute {name}')
+
+def install_bank(archive_path: Path, bank_install_path: Path, packed: bool = True) -> None:
+    # Installed banks are packed into a single file unless the loose wav files are wanted
+    if packed:
+        pack_bank(archive_path, bank_install_path)
+        return
     target = bank_install_path/archive_path.stem
     with ZipFile(archive_path, 'r') as zip_ref:
         zip_ref.extractall(target)
     
-def read_banks(bank_install_path: Path) -> None:
+def read_banks(bank_install_path: Path, preload: bool = False, cache_budget: Optional[int] = None, shared_path: Optional[Path] = None) -> None:
     global _banks
     def read_bank(bank_path: Path) -> Bank:
         json = bank_path/f'{bank_path.name}.json'
@@ -71,11 +37,34 @@ def read_banks(bank_install_path: Path) -> None:
             new_bank = Bank.from_dict(bank_dict)
             return new_bank
     _banks = {}        
-    for item in bank_install_path.iterdir():
-        if item.is_dir():
+    # Packed banks come first and win over a loose copy of the same bank, banks shared by a bank server before either
+    items = sorted(bank_install_path.iterdir(), key=lambda item: item.suffix != PACKED_SUFFIX)
+    if shared_path:
+        items = shared_banks(shared_path, bank_install_path) + items
+    for item in items:
+        if item.suffix == PACKED_SUFFIX and item.stem not in _banks:
+            new_bank = read_packed_bank(item)
+        elif item.is_dir() and item.name not in _banks:
             new_bank = read_bank(item)
-            new_bank.load(bank_install_path)
-            _banks[new_bank.name] = new_bank
+            new_bank.load(bank_install_path, SoundCache(cache_budget))
+        else:
+            continue
+        _check_format(new_bank)
+        if preload:
+            new_bank.cache.preload(new_bank.playable())
+        _banks[new_bank.name] = new_bank
+
+def _check_format(bank: Bank) -> None:
+    # Banks that don't record a format can't be checked, they are converted as they load either way
+    if bank.rate is None:
+        return
+    if bank.rate != SAMPLE_RATE or bank.channels != CHANNELS:
+        warn(f'{bank} was built for {bank.rate} Hz {bank.channels} channel audio but the mixer plays '
+             f'{SAMPLE_RATE} Hz {CHANNELS} channel, its samples will be converted as they load')
+
+def get_banks() -> List[Bank]:
+    # Ordered by name so a program number picks the same bank whatever order they were read in
+    return sorted(_banks.values(), key=lambda bank: bank.name)
 
 def get_bank(bank_name: str = None) -> Bank:
     if bank_name:
@@ -0,0 +1,89 @@
+from hashlib  import sha1
+from json     import dumps, loads
+from os       import getpid, kill
+from pathlib  import Path
+from shutil   import rmtree
+from tempfile import mkdtemp
+from typing   import List
+
+from .packed import PACKED_SUFFIX, pack_bank
+
+class BankServer(object):
+    '''Decodes the loose banks once into shared memory so every piano on the host maps the same copy.
+
+    The banks are published as packed banks in a directory on a memory backed file system, /dev/shm on Linux.
+    Pianos reading their banks with that directory map them read only instead of decoding a copy of their own,
+    so memory grows with the number of banks rather than the number of pianos. Banks that are already packed
+    are shared through the page cache and left where they are.
+
+    Next to every published bank is a small json file naming the server's process and the installed bank it was
+    decoded from, pianos only use a shared bank while its server is running and the installed bank is unchanged.
+    '''
+
+    def __init__(self, bank_install_path: Path, shared_path: Path) -> None:
+        self._bank_install_path = bank_install_path
+        self._shared_path = shared_path
+        self._published: List[Path] = []
+
+    @property
+    def published(self) -> List[Path]:
+        return list(self._published)
+
+    def publish(self) -> List[Path]:
+        # Banks are packed next to where they're published and moved in once complete, a piano never maps half a bank
+        self._shared_path.mkdir(parents=True, exist_ok=True)
+        staging = Path(mkdtemp(prefix='.staging-', dir=self._shared_path))
+        try:
+            for item in sorted(self._bank_install_path.iterdir()):
+                if item.is_dir() and (item/f'{item.name}.json').exists():
+                    packed = pack_bank(item, staging)
+                    origin = packed.with_name(f'{packed.name}.json')
+                    origin.write_text(dumps({'server': getpid(), 'fingerprint': bank_fingerprint(item)}))
+                    # The bank goes in before what vouches for it, until then pianos pass it over
+                    self._published.append(packed.replace(self._shared_path/packed.name))
+                    origin.replace(self._shared_path/origin.name)
+        finally:
+            rmtree(staging, ignore_errors=True)
+        return self.published
+
+    def close(self) -> None:
+        # Pianos that mapped a bank keep it until they let go, new ones go back to decoding their own
+        for packed in self._published:
+            packed.with_name(f'{packed.name}.json').unlink(missing_ok=True)
+            packed.unlink(missing_ok=True)
+        self._published.clear()
+        if self._shared_path.is_dir() and not any(self._shared_path.iterdir()):
+            self._shared_path.rmdir()
+
+def bank_fingerprint(bank_path: Path) -> str:
+    # Rebuilding or reinstalling a bank rewrites its files, so their sizes and times are enough to tell
+    digest = sha1()
+    for item in sorted(bank_path.iterdir()):
+        stat = item.stat()
+        digest.update(f'{item.name} {stat.st_size} {stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+def shared_banks(shared_path: Path, bank_install_path: Path) -> List[Path]:
+    '''The banks in shared_path that a running server decoded from the banks still installed in bank_install_path.'''
+    if not shared_path.is_dir():
+        return []
+    current = []
+    for packed in sorted(shared_path.glob(f'*{PACKED_SUFFIX}')):
+        try:
+            origin = loads(packed.with_name(f'{packed.name}.json').read_text())
+        except (OSError, ValueError):
+            continue
+        installed = bank_install_path/packed.stem
+        if _running(origin['server']) and installed.is_dir() and origin['fingerprint'] == bank_fingerprint(installed):
+            current.append(packed)
+    return current
+
+def _running(pid: int) -> bool:
+    # A server that crashed or was killed never took its banks down
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
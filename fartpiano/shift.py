@@ -0,0 +1,89 @@
+from abc          import ABC, abstractmethod
+from fractions    import Fraction
+from typing       import Dict, Type
+from math         import log2
+from numpy        import arange, hanning, ndarray, pad, rint, tile, zeros
+from scipy.signal import resample_poly
+from librosa      import effects
+
+from .pitch import Pitch
+
+class PitchShifter(ABC):
+
+    @abstractmethod
+    def shift(self, y: ndarray, sr: int, source: Pitch, dest: Pitch) -> ndarray:
+        '''Returns y moved from the source pitch to dest, the result may be a different length when the shifter changes the speed.'''
+        raise NotImplementedError(f'{type(self).__name__} does not implement shift')
+
+class VocoderShifter(PitchShifter):
+
+    def shift(self, y: ndarray, sr: int, source: Pitch, dest: Pitch) -> ndarray:
+        # Phase vocoder stretch and a high quality resample, keeps the length of the recording
+        return effects.pitch_shift(y, sr=sr, n_steps=_steps(source, dest))
+
+class VarispeedShifter(PitchShifter):
+
+    def __init__(self, max_denominator: int = 256) -> None:
+        self._max_denominator = max_denominator
+
+    def shift(self, y: ndarray, sr: int, source: Pitch, dest: Pitch) -> ndarray:
+        # Plays the recording faster or slower like a tape, so higher pitches are also shorter
+        return _varispeed(y, _steps(source, dest), self._max_denominator)
+
+class GranularShifter(PitchShifter):
+
+    def __init__(self, grain: int = 2048, overlap: int = 4, max_denominator: int = 256) -> None:
+        self._grain = grain
+        self._overlap = overlap
+        self._max_denominator = max_denominator
+
+    def shift(self, y: ndarray, sr: int, source: Pitch, dest: Pitch) -> ndarray:
+        # Varispeed for the pitch, then overlapping grains stretch it back to the original length
+        resampled = _varispeed(y, _steps(source, dest), self._max_denominator)
+        if len(resampled) == 0:
+            return zeros(len(y), dtype=y.dtype)
+
+        # Grains are read from whole periods of the new pitch away from where they land,
+        # so neighbouring grains line up in phase where they overlap
+        hop_out = self._grain // self._overlap
+        hop_in = hop_out * len(resampled) / len(y)
+        period = sr / dest.frequency
+        frames = -(-len(y) // hop_out)
+        placed = arange(frames) * hop_out
+        starts = (placed + rint((arange(frames) * hop_in - placed) / period) * period).astype(int).clip(0, len(resampled) - 1)
+
+        source_audio = pad(resampled, (0, self._grain))
+        window = hanning(self._grain).astype(y.dtype)
+        grains = source_audio[starts[:, None] + arange(self._grain)] * window
+
+        # Every overlap'th grain tiles the output without overlapping, so each phase adds in one step
+        length = (frames + self._overlap) * hop_out
+        out = zeros(length, dtype=y.dtype)
+        weights = zeros(length, dtype=y.dtype)
+        for phase in range(self._overlap):
+            tiled = grains[phase::self._overlap].reshape(-1)
+            offset = phase * hop_out
+            out[offset:offset + len(tiled)] += tiled
+            weights[offset:offset + len(tiled)] += tile(window, len(tiled) // self._grain)
+        out /= weights.clip(1e-3)
+        return out[:len(y)]
+
+def _steps(source: Pitch, dest: Pitch) -> float:
+    return log2(dest.frequency / source.frequency) * 12
+
+def _varispeed(y: ndarray, n_steps: float, max_denominator: int) -> ndarray:
+    ratio = Fraction(2 ** (n_steps / 12)).limit_denominator(max_denominator)
+    if ratio == 1:
+        return y
+    return resample_poly(y, ratio.denominator, ratio.numerator).astype(y.dtype)
+
+SHIFT_ENGINES: Dict[str, Type[PitchShifter]] = {
+    'quality': VocoderShifter,
+    'balanced': GranularShifter,
+    'fast': VarispeedShifter,
+}
+
+def get_shift_engine(name: str = 'quality') -> PitchShifter:
+    if name not in SHIFT_ENGINES:
+        raise ValueError(f'Unknown shift engine {name}, expected one of {", ".join(SHIFT_ENGINES)}')
+    return SHIFT_ENGINES[name]()
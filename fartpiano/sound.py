@@ -1,82 +1,227 @@
-from pygame.mixer import Sound, get_busy, pre_init, init as mixer_init
-from threading    import Thread
-from numpy        import ndarray
-from typing       import Any
-from time         import sleep
-
-from .sample import Sample, Bank
-from .pitch  import Pitch
-
-class SoundAction(Thread):
-    def __init__(self, sample: Sample, single_loop: bool) -> None:
-        Thread.__init__(self)
-        self._sample = sample
-        self._attack_sample = Sound(sample.attack)
-        self._sustain_sample = Sound(sample.sustain)
-        self._decay_sample = Sound(sample.decay)
-
-        self._single_loop = single_loop
-        self._sustain_length = self._sustain_sample.get_length()
-        self._playing = False
-        self._release = False
-
-    def attack(self) -> None:
-        if not self._playing:
-            self.start()
+from pygame.mixer import Channel, Sound, get_init, get_num_channels, pre_init, set_reserved, init as mixer_init
+from collections  import deque
+from threading    import Thread, Event, active_count
+from time         import perf_counter
+from typing       import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .sample   import Bank
+from .pitch    import Pitch
+from .cache    import SoundCache
+from .prefetch import KeyHistory, Prefetcher
+from .engine   import VoiceEngine, VoiceStealer, SAMPLE_RATE, CHANNELS, BLOCK_SIZE
+from .metrics  import MetricsRegistry, get_metrics
+
+class MixerOutput(Thread):
+
+    def __init__(self, engine: VoiceEngine, channel_id: int = 0, metrics: Optional[MetricsRegistry] = None) -> None:
+        Thread.__init__(self, daemon=True)
+        self._engine = engine
+        self._channel_id = channel_id
+        self._block_period = engine.block_size / SAMPLE_RATE
+        self._running = False
+        self._stopped = Event()
+
+        metrics = metrics or get_metrics()
+        self._blocks = metrics.counter('mixer_blocks', 'Blocks of audio handed to the mixer')
+        self._underruns = metrics.counter('mixer_underruns', 'Times the mixer ran out of audio while notes were sounding')
+        self._render_time = metrics.histogram('mixer_render_seconds', 'Time taken to mix a block of the sounding voices')
+        metrics.gauge('mixer_channels', 'Channels the mixer was opened with', lambda: get_num_channels() if get_init() else 0)
+        metrics.gauge('mixer_channels_busy', 'Mixer channels playing right now', _busy_channels)
+
+    def run(self) -> None:
+        # Keep the output channel away from anything else that plays through the mixer
+        set_reserved(self._channel_id + 1)
+        channel = Channel(self._channel_id)
+        self._running = True
+        # Whether the last block was handed over while more were still to come
+        streaming = False
+
+        while self._running:
+            if self._engine.idle:
+                streaming = False
+                if channel.get_busy():
+                    self._stopped.wait(self._block_period / 4)
+                else:
+                    self._engine.wait()
+                continue
+
+            # One block plays while the next one waits in the channel queue
+            if channel.get_queue() is None:
+                start = perf_counter()
+                block = Sound(buffer=self._engine.render())
+                self._render_time.observe(perf_counter() - start)
+                self._blocks.inc()
+                if channel.get_busy():
+                    channel.queue(block)
+                else:
+                    if streaming:
+                        self._underruns.inc()
+                    channel.play(block)
+                streaming = True
+            else:
+                self._stopped.wait(self._block_period / 4)
+
+    def stop(self) -> None:
+        self._running = False
+        self._stopped.set()
+        self._engine.wake()
+
+class BankLoader(Thread):
+    '''Decodes banks away from the MIDI and mixer threads and hands each one over once it's ready to play.'''
+
+    def __init__(self, on_ready: Callable[[Bank, float], None]) -> None:
+        Thread.__init__(self, daemon=True)
+        self._on_ready = on_ready
+        # Only the newest request matters, a bank replaced by another before it loaded is never switched to
+        self._pending: Deque[Tuple[Bank, float]] = deque(maxlen=1)
+        self._wake = Event()
+        self._running = False
+
+    def request(self, bank: Bank) -> None:
+        self._pending.append((bank, perf_counter()))
+        self._wake.set()
 
     def run(self) -> None:
-        self._playing = True
-        self._release = False
-
-        attack_channel = self._attack_sample.play()
-        while attack_channel.get_busy():
-            sleep(0.001)
-
-        if self._single_loop:
-            sustain_channel = self._sustain_sample.play()
-            while sustain_channel.get_busy():
-                sleep(0.01)
-        else:
-            sustain_channel = self._sustain_sample.play(loops=-1)
-            while not self._release:
-                sleep(0.1)
-            self._sustain_sample.stop()
-            while sustain_channel.get_busy():
-                sleep(0.001)        
-
-        decay_channel = self._decay_sample.play()
-        while decay_channel.get_busy():
-            sleep(0.001)
-        self._playing = False
-
-    def release(self) -> None:
-        self._release = True
+        self._running = True
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            while self._running and self._pending:
+                bank, requested = self._pending.popleft()
+                if bank.cache is not None:
+                    bank.cache.preload(bank.playable())
+                if not self._pending:
+                    self._on_ready(bank, requested)
 
+    def stop(self) -> None:
+        self._running = False
+        self._wake.set()
 
 class SoundManager(object):
-    def __init__(self, bank: Bank, single_loop_mode) -> None:
-        self._bank = bank
-        self._actions = {}
+    def __init__(self, bank: Bank, single_loop_mode, cache: SoundCache = None, voices: int = 16,
+                 prefetch: int = 0, history: Optional[KeyHistory] = None, warm_keys: int = 8,
+                 stealer: Optional[VoiceStealer] = None, metrics: Optional[MetricsRegistry] = None) -> None:
         self._single_loop_mode = single_loop_mode
+        if cache is None:
+            cache = bank.cache if bank.cache is not None else SoundCache()
+        # The bank and its cache are swapped together in one assignment, a note never sees one without the other
+        self._playing: Tuple[Bank, Any] = (bank, cache)
+        self._history = history
+        self._warm_keys = warm_keys
+        self._loader: Optional[BankLoader] = None
+
+        # Only banks that decode on demand gain anything from decoding ahead of time
+        self._prefetcher = None
+        if prefetch or history:
+            self._prefetcher = Prefetcher(cache, bank, prefetch)
+            self._prefetcher.start()
+            if history and isinstance(cache, SoundCache):
+                self._prefetcher.request(history.most_played(warm_keys))
+
+        self._engine = VoiceEngine(voices, stealer=stealer)
+        self._output = MixerOutput(self._engine, metrics=metrics)
+        self._output.start()
+
+        metrics = metrics or get_metrics()
+        self._attacks = metrics.counter('notes_attacked', 'Notes started')
+        self._releases = metrics.counter('notes_released', 'Notes let go')
+        self._missing = metrics.counter('notes_missing', 'Notes played that the bank has no sample for')
+        self._attack_time = metrics.histogram('attack_seconds', 'Time taken to find, decode if needed and start the sound of a note')
+        metrics.gauge('voices', 'Voices the engine can sound at once', lambda: self._engine.voices)
+        metrics.gauge('active_voices', 'Voices sounding right now', lambda: self._engine.active_voices)
+        metrics.gauge('voices_stolen', 'Sounding notes cut off to make room for new ones', lambda: self._engine.stats['stolen'], 'counter')
+        metrics.gauge('voices_dropped', 'New notes dropped because every voice was in use', lambda: self._engine.stats['dropped'], 'counter')
+        metrics.gauge('threads', 'Python threads running', active_count)
+        for name, description in (('hits', 'Notes whose sound was already decoded'), ('misses', 'Notes that had to be decoded when played'),
+                                  ('evictions', 'Decoded sounds dropped to stay within the cache budget'), ('prefetched', 'Sounds decoded ahead of being played')):
+            metrics.gauge(f'cache_{name}', description, lambda name=name: self._cache_stats().get(name, 0), 'counter')
+        metrics.gauge('cache_bytes', 'Memory used by decoded sounds', lambda: self.cache.size)
+        self._switches = metrics.counter('bank_switches', 'Times the playing bank was replaced')
+        self._switch_time = metrics.histogram('bank_switch_seconds', 'Time from asking for a bank to it playing, including decoding it')
+
+    @property
+    def engine(self) -> VoiceEngine:
+        return self._engine
+
+    @property
+    def bank(self) -> Bank:
+        return self._playing[0]
+
+    @property
+    def cache(self) -> SoundCache:
+        return self._playing[1]
 
     def attack(self, pitch: Pitch) -> None:
-        if pitch not in self._actions:
-            sa = SoundAction(self._bank.samples[pitch], self._single_loop_mode)
-            self._actions[pitch] = sa
-            sa.attack()
+        start = perf_counter()
+        bank, cache = self._playing
+        sample = bank.sample(pitch)
+        if sample is None:
+            self._missing.inc()
+            return
+        self._engine.attack(pitch, cache.get(sample), self._single_loop_mode)
+        self._attack_time.observe(perf_counter() - start)
+        self._attacks.inc()
+        if self._history:
+            self._history.record(pitch)
+        if self._prefetcher and isinstance(cache, SoundCache):
+            self._prefetcher.around(pitch)
+
+    def switch_bank(self, bank: Bank) -> None:
+        # Returns straight away, the current bank plays on until the new one is decoded
+        if self._loader is None:
+            self._loader = BankLoader(self._swap)
+            self._loader.start()
+        self._loader.request(bank)
+
+    def _swap(self, bank: Bank, requested: float) -> None:
+        old_bank, old_cache = self._playing
+        if bank is old_bank:
+            return
+        cache = bank.cache if bank.cache is not None else SoundCache()
+        self._playing = (bank, cache)
+        if self._prefetcher:
+            self._prefetcher.retarget(cache, bank)
+        if self._history:
+            # Every bank keeps count of its own keys, next to the first bank's
+            old_history = self._history
+            self._history = KeyHistory(old_history.path.with_name(f'{bank.name}.json'))
+            old_history.save()
+            if isinstance(cache, SoundCache):
+                self._prefetcher.request(self._history.most_played(self._warm_keys))
+        self._switch_time.observe(perf_counter() - requested)
+        self._switches.inc()
+        # Notes still sounding keep their own sounds alive, so the old bank's decoded samples can go now
+        old_cache.clear()
+
+    def _cache_stats(self) -> Dict[str, int]:
+        cache = self._playing[1]
+        return cache.stats if isinstance(cache, SoundCache) else {}
 
     def release(self, pitch: Pitch) -> None:
-        if pitch in self._actions:
-            self._actions[pitch].release()
-            # self._actions[pitch].join()
-            del self._actions[pitch]
+        self._engine.release(pitch)
+        self._releases.inc()
 
     def stop_all(self):
-        for pitch in list(self._actions.keys()):
-            self.release(pitch)
+        self._engine.stop_all()
+
+    def close(self) -> None:
+        if self._loader:
+            self._loader.stop()
+            self._loader.join()
+        if self._prefetcher:
+            self._prefetcher.stop()
+            self._prefetcher.join()
+        if self._history:
+            self._history.save()
+        self._output.stop()
+        self._output.join()
+
+def _busy_channels() -> int:
+    if not get_init():
+        return 0
+    return sum(Channel(channel).get_busy() for channel in range(get_num_channels()))
 
 def init_sound() -> None:
-    pre_init(44100, -16, 1, 512)
+    # Lock the mixer to the engine's format so blocks never need converting
+    pre_init(SAMPLE_RATE, -16, CHANNELS, BLOCK_SIZE, allowedchanges=0)
     mixer_init()
-    
-    
\ No newline at end of file
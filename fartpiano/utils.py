@@ -1,6 +1,7 @@
 from configparser import ConfigParser
 from importlib    import resources as pkg_resources
 from pathlib      import Path
+from tempfile     import gettempdir
 
 config: ConfigParser = None
 
@@ -22,6 +23,19 @@ def get_configuration_file() -> Path:
             return packaged
     return run_in_source    
     
+def get_build_cache_path() -> Path:
+    return Path.home()/'.cache'/'fartpiano'/'build'
+
+def get_shared_bank_path() -> Path:
+    # A memory backed file system where there is one, otherwise the banks are shared through the page cache
+    shared_memory = Path('/dev/shm')
+    if shared_memory.is_dir():
+        return shared_memory/'fartpiano'
+    return Path(gettempdir())/'fartpiano'
+
+def get_history_path() -> Path:
+    return Path.home()/'.cache'/'fartpiano'/'history'
+
 def get_default_bank_path() -> Path:
     user_banks = Path.home()/'.cache'/'fartpiano'/'banks'
     run_in_source = Path.cwd()/'fartpiano'/'resources'/'banks'